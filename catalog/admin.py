@@ -1,17 +1,41 @@
 # // 5 models: Genre, Language, Author, Book, BookInstance
 
 from django.contrib import admin
-from .models import Author, Book, BookInstance, Genre, Language
+from django.contrib.admin import helpers
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
+from . import circulation
+from .forms import ExtendDueBackForm
+from .models import Author, Book, BookInstance, CirculationLog, Genre, Hold, Language
+from .pagination import CachedCountPaginator
+
+
+# // a book can have thousands of copies: the inline only edits the first
+# // max_rows of them, the rest are reached from the BookInstance changelist
+class CappedInlineFormSet(BaseInlineFormSet):
+    max_rows = 20
+    
+    def get_queryset(self):
+        if not hasattr(self, '_capped_queryset'):
+            self._capped_queryset = super().get_queryset()[:self.max_rows]
+        return self._capped_queryset
+
 
 # // Inline to add inside different admin_model
 class BooksInstanceInline(admin.TabularInline):
     model = BookInstance
+    formset = CappedInlineFormSet
+    extra = 1
+    show_change_link = True
+    # // a select of every User would be rendered once per row
+    autocomplete_fields = ['borrower']
     
 class BooksInline(admin.TabularInline):
     # model = Book
     # // many-to-many relationship
     model = Book.author.through
     extra = 3
+    autocomplete_fields = ['book']
 
 # p4m2> Advanced configuration of admin site
 # // Define AuthorAdmin class, then register Author & AuthorAdmin
@@ -24,6 +48,9 @@ class AuthorAdmin(admin.ModelAdmin):
     # // Error: cuz 'catalog.Book' has no ForeignKey to 'catalog.Author'
     # // I make modify in catalog.Book to have many authors.
     inlines = [BooksInline]
+    # // for the author pickers of BookAdmin
+    search_fields = ['last_name', 'first_name']
+    show_full_result_count = False
     # pass
 
 admin.site.register(Author, AuthorAdmin)
@@ -34,6 +61,17 @@ admin.site.register(Author, AuthorAdmin)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'display_author', 'display_genre')
     inlines = [BooksInstanceInline]
+    # // for the book pickers of BookInstanceAdmin/AuthorAdmin
+    search_fields = ['title', 'isbn']
+    autocomplete_fields = ['author']
+    # // changelist count from cache / estimate (catalog/pagination.py),
+    # // and no second, unfiltered COUNT(*) for the "n total" link
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    
+    # // display_author/display_genre read the prefetched relations
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('author', 'genre')
     # pass
 
 # // Register Admin classe for BookInstance using the decorator
@@ -42,15 +80,89 @@ class BookInstanceAdmin(admin.ModelAdmin):
     # // p8> adding borrower field
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    # // book (via __str__) and borrower in the changelist query, not one query per row
+    list_select_related = ('book', 'borrower')
+    autocomplete_fields = ['book', 'borrower']
+    # // the biggest table: never COUNT(*) it on every changelist hit
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     
     # // make 2 sets (as section) which includ fields
     fieldsets = (
         (None, {'fields': ('book', 'imprint', 'id')}),
         ('Availability', {'fields': ('status', 'due_back', 'borrower')}),
     )
+    
+    # // bulk circulation: one UPDATE for all selected copies (catalog/circulation.py)
+    actions = ['mark_returned', 'mark_available', 'send_to_maintenance', 'extend_due_back']
+    
+    def _report(self, request, updated, done):
+        self.message_user(request, f'{updated} {"copy" if updated == 1 else "copies"} {done}.')
+    
+    def mark_returned(self, request, queryset):
+        self._report(request, circulation.mark_returned(queryset, request.user), 'marked returned')
+    mark_returned.short_description = 'Mark selected loans returned'
+    mark_returned.allowed_permissions = ('change',)
+    
+    def mark_available(self, request, queryset):
+        self._report(request, circulation.mark_available(queryset, request.user), 'marked available')
+    mark_available.short_description = 'Mark selected copies available'
+    mark_available.allowed_permissions = ('change',)
+    
+    def send_to_maintenance(self, request, queryset):
+        self._report(request, circulation.send_to_maintenance(queryset, request.user), 'sent to maintenance')
+    send_to_maintenance.short_description = 'Send selected copies to maintenance'
+    send_to_maintenance.allowed_permissions = ('change',)
+    
+    # // asks for the number of weeks first, then posts back to the same action
+    def extend_due_back(self, request, queryset):
+        form = ExtendDueBackForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            weeks = form.cleaned_data['weeks']
+            updated = circulation.extend_due_back(queryset, weeks, request.user)
+            self._report(request, updated, f'extended by {weeks} {"week" if weeks == 1 else "weeks"}')
+            return None
+        return TemplateResponse(request, 'admin/catalog/bookinstance/extend_due_back.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Extend due date',
+            'opts': self.model._meta,
+            'form': form,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+    extend_due_back.short_description = 'Extend due date of selected loans'
+    extend_due_back.allowed_permissions = ('change',)
     # pass
 
 
+# // read-only history of the bulk circulation actions
+@admin.register(CirculationLog)
+class CirculationLogAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'action', 'copy', 'old_status', 'new_status', 'old_due_back', 'new_due_back', 'user')
+    list_filter = ('action',)
+    list_select_related = ('copy__book', 'user')
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'patron', 'status', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    list_select_related = ('book', 'patron')
+    autocomplete_fields = ['book', 'patron']
+    raw_id_fields = ['copy']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+
 # p4m1> simply register all models with admin site
 admin.site.register(Genre)
 admin.site.register(Language)
@@ -0,0 +1,154 @@
+# // /catalog/api.py
+# // Read-only JSON API (v1) mirroring the book/author list & detail pages,
+# // for kiosks and the mobile app.
+# //   /catalog/api/v1/books/        /catalog/api/v1/books/<pk>/
+# //   /catalog/api/v1/authors/      /catalog/api/v1/authors/<pk>/
+# // Responses carry a strong ETag and Last-Modified computed from updated_at
+# // with one small query; a matching If-None-Match/If-Modified-Since gets a
+# // 304 before any row is fetched or serialized.
+
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+
+from catalog.conditional import compute_validators, set_validators
+from catalog.models import Author, Book
+from catalog.pagination import CachedCountPaginator
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _conditional(request, etag, last_modified, build):
+    # // 304/412 straight from the validators, otherwise build() the body
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build())
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return set_validators(response, etag, last_modified)
+
+
+def _page_params(request):
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise Http404('Invalid page')
+    return page, page_size
+
+
+# // stamp_annotations: extra timestamps a row's body depends on (e.g. its authors')
+def _list(request, queryset, serialize_rows, **stamp_annotations):
+    page, page_size = _page_params(request)
+    count = CachedCountPaginator(queryset, page_size).count
+    offset = (page - 1) * page_size
+    # // the only query on a 304 (besides the cached count): ids & timestamps of this page
+    stamps = list(
+        queryset.annotate(**stamp_annotations)
+        .values_list('pk', 'updated_at', *stamp_annotations)[offset:offset + page_size]
+    )
+    if not stamps and page > 1:
+        raise Http404('Invalid page')
+    etag, last_modified = compute_validators(
+        'v1', queryset.model._meta.label_lower, page, page_size, count, stamps,
+        timestamps=[stamp for row in stamps for stamp in row[1:]])
+
+    def build():
+        num_pages = max((count + page_size - 1) // page_size, 1)
+        return {
+            'count': count,
+            'page': page,
+            'num_pages': num_pages,
+            'next': page + 1 if page < num_pages else None,
+            'previous': page - 1 if page > 1 else None,
+            'results': serialize_rows([row[0] for row in stamps]),
+        }
+    return _conditional(request, etag, last_modified, build)
+
+
+# //=====================================
+# // serializers: values() projections, no model instances
+# //=====================================
+def _authors_by_book(book_ids):
+    authors = {}
+    rows = Book.author.through.objects.filter(book_id__in=book_ids).order_by(
+        'author__last_name', 'author__first_name').values('book_id', 'author_id', 'author__first_name', 'author__last_name')
+    for row in rows:
+        authors.setdefault(row['book_id'], []).append({
+            'id': row['author_id'],
+            'name': f"{row['author__first_name']} {row['author__last_name']}",
+        })
+    return authors
+
+
+def serialize_books(book_ids, detail=False):
+    fields = ['id', 'title', 'isbn', 'language__name', 'updated_at']
+    if detail:
+        fields.append('summary')
+    rows = {row['id']: row for row in Book.objects.filter(pk__in=book_ids).values(*fields)}
+    authors = _authors_by_book(book_ids)
+    genres = {}
+    if detail:
+        for book_id, name in Book.genre.through.objects.filter(book_id__in=book_ids).order_by(
+                'genre__name').values_list('book_id', 'genre__name'):
+            genres.setdefault(book_id, []).append(name)
+    results = []
+    for pk in book_ids:
+        row = rows[pk]
+        row['language'] = row.pop('language__name')
+        row['authors'] = authors.get(pk, [])
+        if detail:
+            row['genres'] = genres.get(pk, [])
+        results.append(row)
+    return results
+
+
+def serialize_authors(author_ids):
+    rows = Author.objects.filter(pk__in=author_ids).values(
+        'id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death', 'updated_at')
+    rows = {row['id']: row for row in rows}
+    return [rows[pk] for pk in author_ids]
+
+
+# //=====================================
+# // views
+# //=====================================
+@require_GET
+def book_list(request):
+    return _list(request, Book.objects.order_by('title', 'pk'), serialize_books,
+                 authors_updated=Max('author__updated_at'))
+
+
+@require_GET
+def author_list(request):
+    return _list(request, Author.objects.order_by('last_name', 'first_name', 'pk'), serialize_authors)
+
+
+@require_GET
+def book_detail(request, pk):
+    # // the book's own timestamp + its authors' (their names are in the body)
+    stamps = Book.objects.filter(pk=pk).annotate(
+        authors_updated=Max('author__updated_at'), num_authors=Count('author')
+    ).values_list('updated_at', 'authors_updated', 'num_authors').first()
+    if stamps is None:
+        raise Http404('No book found')
+    etag, last_modified = compute_validators('v1', 'book', pk, stamps, timestamps=stamps[:2])
+    return _conditional(request, etag, last_modified, lambda: serialize_books([pk], detail=True)[0])
+
+
+@require_GET
+def author_detail(request, pk):
+    # // the author's own timestamp + the books listed in the body
+    stamps = Author.objects.filter(pk=pk).annotate(
+        books_updated=Max('book__updated_at'), num_books=Count('book')
+    ).values_list('updated_at', 'books_updated', 'num_books').first()
+    if stamps is None:
+        raise Http404('No author found')
+    etag, last_modified = compute_validators('v1', 'author', pk, stamps, timestamps=stamps[:2])
+
+    def build():
+        author = serialize_authors([pk])[0]
+        author['books'] = list(Book.objects.filter(author=pk).order_by('title', 'pk').values('id', 'title'))
+        return author
+    return _conditional(request, etag, last_modified, build)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CatalogConfig(AppConfig):
     name = 'catalog'
+
+    def ready(self):
+        # // register signal receivers (cache invalidation, counters, ...)
+        from catalog import signals  # noqa: F401
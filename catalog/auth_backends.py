@@ -0,0 +1,32 @@
+# // /catalog/auth_backends.py
+# // ModelBackend whose permission sets outlive the request.
+# // Django caches a user's permissions on the User object, i.e. for one request;
+# // staff pages (permission_required views, the sidebar's perms checks) then
+# // pay the joins over auth_user_user_permissions / auth_user_groups /
+# // auth_group_permissions on every request. Here the set is kept in the cache
+# // (catalog/cache.py), keyed by the user's generation, bumped when their row,
+# // permissions or groups change, and by the Group/Permission model
+# // generations, bumped when a group's permissions change (catalog/signals.py).
+# // Only with a cache shared by all processes (CACHES): a per-process one would
+# // keep granting a revoked permission in every worker but the one that saw the
+# // change, so with locmem/dummy it behaves as ModelBackend.
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+
+from catalog.cache import cached_value, get_generation, is_shared_cache
+
+
+class CachedPermissionBackend(ModelBackend):
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not is_shared_cache():
+            return super().get_all_permissions(user_obj, obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            generation = get_generation(type(user_obj), user_obj.pk)
+            user_obj._perm_cache = cached_value(
+                'permissions', lambda: super(CachedPermissionBackend, self).get_all_permissions(user_obj),
+                models=(Group, Permission), key_parts=(user_obj.pk, generation),
+            )
+        return user_obj._perm_cache
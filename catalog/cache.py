@@ -0,0 +1,225 @@
+# // /catalog/cache.py
+# // The catalog's caching layer, on top of the CACHES backend chosen in settings
+# // (locmem, file-based or a Redis-protocol server, see catalog/cache_backends.py).
+# // Keys embed generation counters instead of being deleted: a model's
+# // generation is bumped on every change of any of its rows, an object's on
+# // every change of something it renders (catalog/signals.py). Keys that embed
+# // a generation are never stale, old ones simply stop being read and expire.
+# //   @cached(name, models=...)     cache a function's result per arguments
+# //   cached_queryset(qs, name)     cache list(qs) per SQL
+# //   cache_metrics()               hits/misses per cached name
+
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from catalog import db_router
+
+METRICS_NAMES_KEY = 'catalog:metrics:names'
+
+_MISSING = object()
+_known_names = set()
+
+
+def _fresh_generation():
+    # // a lost counter restarts above every value it could have had
+    return int(time.time() * 1000)
+
+
+# // replicas may still serve the old rows for a while after a bump
+def _settling_key(key):
+    return f'{key}:settling'
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), None)
+    if db_router.lag_window():
+        cache.set(_settling_key(key), 1, db_router.lag_window())
+
+
+# // inside a transaction: now, for the writer's own later reads, and again
+# // after commit, since until then other requests still read the old rows and
+# // may cache them under the new generation
+def _bump(key):
+    _increment(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(functools.partial(_increment, key))
+
+
+# // a reader on a replica within the settling window gets (generation,
+# // 'replica'): what it caches is not served once the replicas caught up
+def _settle(found, keys):
+    if not db_router.reads_from_replica():
+        return found
+    settling = cache.get_many([_settling_key(key) for key in keys])
+    return {
+        key: (generation, 'replica') if _settling_key(key) in settling else generation
+        for key, generation in found.items()
+    }
+
+
+def _read_generations(keys):
+    found = cache.get_many(keys)
+    missing = {key: _fresh_generation() for key in keys if key not in found}
+    for key, generation in missing.items():
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+        found[key] = generation
+    return _settle(found, keys)
+
+
+# //=====================================
+# // model generations: bumped on any change of the model's rows
+# //=====================================
+def _model_generation_key(model):
+    return f'catalog:gen:{model._meta.label_lower}'
+
+
+def get_model_generations(models):
+    keys = [_model_generation_key(model) for model in models]
+    found = _read_generations(keys)
+    return tuple(found[key] for key in keys)
+
+
+def bump_model_generation(model):
+    _bump(_model_generation_key(model))
+
+
+# //=====================================
+# // object generations: bumped when something the object renders changes
+# //=====================================
+# // pk LIST: the membership and order of the model's list pages
+LIST = 'list'
+
+
+def _generation_key(model, pk):
+    return f'catalog:gen:{model._meta.label_lower}:{pk}'
+
+
+def get_generation(model, pk):
+    return get_generations(model, [pk])[pk]
+
+
+def get_generations(model, pks):
+    keys = {_generation_key(model, pk): pk for pk in pks}
+    found = _read_generations(list(keys))
+    return {pk: found[key] for key, pk in keys.items()}
+
+
+# // (model, pk) pairs of any models, in order
+def get_object_generations(objects):
+    keys = [_generation_key(model, pk) for model, pk in objects]
+    found = _read_generations(keys)
+    return tuple(found[key] for key in keys)
+
+
+def bump_generation(model, pk):
+    _bump(_generation_key(model, pk))
+
+
+def bump_generations(model, pks):
+    for pk in set(pks):
+        bump_generation(model, pk)
+
+
+def fragment_cache_timeout():
+    # // versioned fragments never go stale; the TTL only reclaims old versions
+    return getattr(settings, 'CATALOG_FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+# //=====================================
+# // hit/miss metrics, shared by all processes through the cache
+# //=====================================
+def _metric_key(name, outcome):
+    return f'catalog:metrics:{name}:{outcome}'
+
+
+def _register(name):
+    if name in _known_names:
+        return
+    _known_names.add(name)
+    names = cache.get(METRICS_NAMES_KEY, set())
+    if name not in names:
+        cache.set(METRICS_NAMES_KEY, names | {name}, None)
+
+
+def count_lookup(name, hit):
+    _register(name)
+    key = _metric_key(name, 'hits' if hit else 'misses')
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def cache_metrics():
+    names = sorted(cache.get(METRICS_NAMES_KEY, set()) | _known_names)
+    values = cache.get_many([_metric_key(name, outcome) for name in names for outcome in ('hits', 'misses')])
+    return {
+        name: {
+            'hits': values.get(_metric_key(name, 'hits'), 0),
+            'misses': values.get(_metric_key(name, 'misses'), 0),
+        }
+        for name in names
+    }
+
+
+def reset_cache_metrics():
+    names = cache.get(METRICS_NAMES_KEY, set()) | _known_names
+    cache.delete_many([_metric_key(name, outcome) for name in names for outcome in ('hits', 'misses')])
+
+
+# //=====================================
+# // cached values
+# //=====================================
+# // whether every process sees the same entries (and so the same bumps)
+def is_shared_cache():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def default_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+# // models: whose generations the value depends on; key_parts: anything else
+# // it depends on (arguments, SQL); both go into the key
+def cached_value(name, compute, models, key_parts=(), timeout=None):
+    generations = get_model_generations(models)
+    digest = hashlib.md5(repr((key_parts, generations)).encode()).hexdigest()
+    key = f'catalog:cached:{name}:{digest}'
+    value = cache.get(key, _MISSING)
+    count_lookup(name, value is not _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, default_timeout() if timeout is None else timeout)
+    return value
+
+
+def cached(name, models, timeout=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cached_value(
+                name, lambda: func(*args, **kwargs), models, (args, sorted(kwargs.items())), timeout)
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+# // list(queryset), keyed by its SQL (evaluated on a clone, queryset's own
+# // result cache is left alone); models defaults to the queryset's model,
+# // pass every model the query joins
+def cached_queryset(queryset, name, models=None, timeout=None):
+    sql, params = queryset.query.sql_with_params()
+    return cached_value(
+        name, lambda: list(queryset.all()), models or [queryset.model], (queryset.db, sql, params), timeout)
@@ -0,0 +1,247 @@
+# // /catalog/cache_backends.py
+# // A Django cache backend for any server speaking the Redis protocol (RESP):
+# // Redis, KeyDB, Dragonfly... or a local stand-in. No client library needed.
+# //   CACHES = {'default': {
+# //       'BACKEND': 'catalog.cache_backends.RedisCache',
+# //       'LOCATION': 'redis://127.0.0.1:6379/0',
+# //   }}
+# // Integers are stored as plain numbers so INCRBY works on them (counters,
+# // generations), everything else is pickled.
+# // FileCache: Django's file-based cache with an incr() that is atomic across
+# // the processes sharing the directory.
+
+import contextlib
+import os
+import pickle
+import socket
+import threading
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # // Windows: development only, one process
+    fcntl = None
+
+
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    def __init__(self, host, port, db=0, password=None, timeout=5):
+        self.host, self.port, self.db, self.password, self.timeout = host, port, db, password, timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock = self._file = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Connection closed by the cache server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            return RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self._file.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply {line!r}')
+
+    def _call(self, *args):
+        self._sock.sendall(self._encode(args))
+        reply = self._read()
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    # // one retry on a fresh connection (server restart, idle timeout)
+    def call(self, *args):
+        for attempt in (1, 2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except (ConnectionError, socket.timeout, OSError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+
+class RedisCache(BaseCache):
+    # // Django's contract: incrementing a missing key is an error, INCRBY alone
+    # // would create it; one script, so no bump can slip between the two
+    INCR_SCRIPT = (
+        "if redis.call('EXISTS', KEYS[1]) == 0 then return false end "
+        "return redis.call('INCRBY', KEYS[1], ARGV[1])"
+    )
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlparse(server if '://' in server else f'redis://{server}')
+        self._address = (
+            url.hostname or '127.0.0.1', url.port or 6379,
+            int(url.path.lstrip('/') or 0), url.password,
+        )
+        self._socket_timeout = params.get('OPTIONS', {}).get('SOCKET_TIMEOUT', 5)
+        self._local = threading.local()
+
+    @property
+    def _client(self):
+        # // one connection per thread
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = RespConnection(*self._address, timeout=self._socket_timeout)
+        return client
+
+    # // seconds from now (BaseCache returns an absolute time), None for no expiry
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dumps(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(raw):
+        try:
+            return int(raw)
+        except ValueError:
+            return pickle.loads(raw)
+
+    def _set_args(self, key, value, timeout):
+        args = ['SET', key, self._dumps(value)]
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            # // PX 0 is refused by the server; a non-positive timeout means "expire now"
+            args += ['PX', max(int(timeout * 1000), 1)]
+        return args
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        args = self._set_args(self._key(key, version), value, timeout)
+        return self._client.call(*args, 'NX') is not None
+
+    def get(self, key, default=None, version=None):
+        raw = self._client.call('GET', self._key(key, version))
+        return default if raw is None else self._loads(raw)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._client.call(*self._set_args(self._key(key, version), value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return bool(self._client.call('PERSIST', key)) or bool(self._client.call('EXISTS', key))
+        return bool(self._client.call('PEXPIRE', key, max(int(timeout * 1000), 1)))
+
+    def delete(self, key, version=None):
+        return bool(self._client.call('DEL', self._key(key, version)))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        raws = self._client.call('MGET', *[self._key(key, version) for key in keys])
+        return {key: self._loads(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+    def has_key(self, key, version=None):
+        return bool(self._client.call('EXISTS', self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        try:
+            value = self._client.call('EVAL', self.INCR_SCRIPT, 1, key, delta)
+        except RedisError as e:
+            raise ValueError(str(e))
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.call('DEL', *keys)
+
+    def clear(self):
+        self._client.call('FLUSHDB')
+
+    # // Django calls close() after every request: keep the thread's connection
+    # // open for the next one, disconnect() really closes it
+    def close(self, **kwargs):
+        pass
+
+    def disconnect(self):
+        client = getattr(self._local, 'client', None)
+        if client is not None:
+            client.close()
+            self._local.client = None
+
+
+class FileCache(FileBasedCache):
+    # // FileBasedCache.incr() is get() then set(): serialised with a lock file,
+    # // so concurrent bumps from several workers are not lost
+    def incr(self, key, delta=1, version=None):
+        with self._locked():
+            return super().incr(key, delta, version)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        self._createdir()
+        with open(os.path.join(self._dir, 'incr.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
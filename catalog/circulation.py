@@ -0,0 +1,292 @@
+# // /catalog/circulation.py
+# // Circulation: single-copy checkout / return / renew (circulation desk page
+# // and JSON endpoints), holds, and actions on many copies at once
+# // (BookInstanceAdmin actions, batch renewal page).
+# // Single-copy actions lock the copy row (SELECT ... FOR UPDATE) and write only
+# // the changed columns with save(update_fields=...), so signals still run.
+# // Each bulk action is a single UPDATE over the selected copies, in one transaction,
+# // after locking them. queryset.update() sends no signals, so the bookkeeping
+# // catalog/signals.py does per save is done here once for the whole set:
+# // status counters, home page stats, cached counts, book fragments and
+# // updated_at; every changed copy gets a CirculationLog row.
+
+import collections
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, F, Q
+from django.utils import timezone
+
+from catalog import counters
+from catalog.cache import bump_generations, bump_model_generation
+from catalog.models import Book, BookInstance, CirculationLog, Hold
+from catalog.signals import touch_books
+from catalog.stats import invalidate_library_stats
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+
+class CirculationError(Exception):
+    pass
+
+
+# //=====================================
+# // one copy at a time
+# //=====================================
+def _log(copy, action, old_status, old_due_back, user):
+    CirculationLog.objects.create(
+        copy=copy, action=action, user=user,
+        old_status=old_status, new_status=copy.status,
+        old_due_back=old_due_back, new_due_back=copy.due_back,
+    )
+
+
+def _locked_copy(copy_id):
+    try:
+        return BookInstance.objects.select_for_update().get(pk=copy_id)
+    except BookInstance.DoesNotExist:
+        raise CirculationError('No such copy')
+
+
+# // copy_id: lend that copy; otherwise the copy reserved for the borrower, or
+# // any available copy of the book.
+# // skip_locked: concurrent checkouts of the same title each take a different
+# // copy instead of queueing on the first one (partial index copy_available_idx)
+def checkout(borrower, book_id=None, copy_id=None, due_back=None, user=None):
+    with transaction.atomic():
+        if copy_id is not None:
+            copy = _locked_copy(copy_id)
+            if copy.status != 'a' and not (copy.status == 'r' and copy.borrower_id == borrower.pk):
+                raise CirculationError('Copy is not available')
+        else:
+            copy = (
+                BookInstance.objects.select_for_update().filter(
+                    book_id=book_id, status__exact='r', borrower=borrower).order_by().first()
+                or BookInstance.objects.select_for_update(skip_locked=True).filter(
+                    book_id=book_id, status__exact='a').order_by().first()
+            )
+            if copy is None:
+                raise CirculationError('No available copy of this book')
+        old_status, old_due_back = copy.status, copy.due_back
+        copy.status = 'o'
+        copy.borrower = borrower
+        copy.due_back = due_back or datetime.date.today() + LOAN_PERIOD
+        copy.save(update_fields=['status', 'borrower', 'due_back', 'updated_at'])
+        _log(copy, 'checked_out', old_status, old_due_back, user)
+        if old_status == 'r':
+            Hold.objects.filter(copy=copy, status__exact='r').update(status='f')
+    return copy
+
+
+# // the copy goes to the head of its book's queue, or back on the shelf
+def return_copy(copy_id, user=None):
+    with transaction.atomic():
+        copy = _locked_copy(copy_id)
+        if copy.status != 'o':
+            raise CirculationError('Copy is not on loan')
+        old_due_back = copy.due_back
+        _shelve_or_reserve(copy)
+        _log(copy, 'returned', 'o', old_due_back, user)
+    return copy
+
+
+# // due_back is checked by the forms (check_renewal_date)
+def renew(copy_id, due_back, user=None):
+    with transaction.atomic():
+        copy = _locked_copy(copy_id)
+        if copy.status != 'o':
+            raise CirculationError('Copy is not on loan')
+        old_due_back = copy.due_back
+        copy.due_back = due_back
+        copy.save(update_fields=['due_back', 'updated_at'])
+        _log(copy, 'renewed', 'o', old_due_back, user)
+    return copy
+
+
+# //=====================================
+# // holds: a queue of patrons per book
+# //=====================================
+def pickup_deadline(now=None):
+    return (now or timezone.now()) + datetime.timedelta(days=getattr(settings, 'CATALOG_HOLD_PICKUP_DAYS', 7))
+
+
+# // head of the book's queue: one range scan of hold_queue_idx; skip_locked so
+# // copies returned at the same time go to different patrons
+def _next_hold(book_id):
+    return Hold.objects.select_for_update(skip_locked=True).filter(
+        book_id=book_id, status__exact='w').order_by('created_at', 'pk').first()
+
+
+def _reserve(copy, hold, now=None):
+    hold.status = 'r'
+    hold.copy = copy
+    hold.expires_at = pickup_deadline(now)
+    hold.save(update_fields=['status', 'copy', 'expires_at'])
+    copy.status = 'r'
+    copy.borrower_id = hold.patron_id
+    copy.due_back = timezone.localdate(hold.expires_at)
+    copy.save(update_fields=['status', 'borrower', 'due_back', 'updated_at'])
+
+
+def _shelve_or_reserve(copy, now=None):
+    hold = _next_hold(copy.book_id) if copy.book_id else None
+    if hold is not None:
+        _reserve(copy, hold, now)
+        return hold
+    copy.status = 'a'
+    copy.borrower = None
+    copy.due_back = None
+    copy.save(update_fields=['status', 'borrower', 'due_back', 'updated_at'])
+    return None
+
+
+# // an available copy is reserved straight away, otherwise the patron waits
+def place_hold(book_id, patron):
+    with transaction.atomic():
+        if Hold.objects.filter(book_id=book_id, patron=patron, status__in=('w', 'r')).exists():
+            raise CirculationError('You already hold this book')
+        hold = Hold.objects.create(book_id=book_id, patron=patron)
+        copy = BookInstance.objects.select_for_update(skip_locked=True).filter(
+            book_id=book_id, status__exact='a').order_by().first()
+        if copy is not None:
+            _reserve(copy, hold)
+    return hold
+
+
+def cancel_hold(hold):
+    with transaction.atomic():
+        hold = Hold.objects.select_for_update().get(pk=hold.pk)
+        if hold.status not in ('w', 'r'):
+            raise CirculationError('Hold is no longer active')
+        copy_id = hold.copy_id if hold.status == 'r' else None
+        hold.status = 'c'
+        hold.save(update_fields=['status'])
+        if copy_id is not None:
+            _shelve_or_reserve(_locked_copy(copy_id))
+    return hold
+
+
+# // reserved copies not picked up in time go to the next patron in line;
+# // batch_size holds per transaction, so locks stay short
+def expire_holds(batch_size=500, now=None):
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            holds = list(Hold.objects.select_for_update(skip_locked=True).filter(
+                status__exact='r', expires_at__lt=now).order_by('expires_at').values_list('pk', 'copy_id')[:batch_size])
+            if not holds:
+                return expired
+            Hold.objects.filter(pk__in=[pk for pk, copy_id in holds]).update(status='x')
+            copies = BookInstance.objects.select_for_update().filter(
+                pk__in=[copy_id for pk, copy_id in holds if copy_id], status__exact='r')
+            for copy in copies:
+                _shelve_or_reserve(copy, now)
+            expired += len(holds)
+        if len(holds) < batch_size:
+            return expired
+
+
+# //=====================================
+# // many copies at once
+# //=====================================
+# // statuses: the copies the action applies to, the other selected ones are skipped.
+# // Holds are kept in step: reserved copies changed to another status put their
+# // hold back in the queue, copies made available are reserved for the queue.
+def _apply(queryset, action, statuses, changes, user, extend_by=None):
+    selected = queryset.order_by().values('pk')
+    condition = Q(pk__in=selected, status__in=statuses)
+    if extend_by is not None:
+        condition &= Q(due_back__isnull=False)
+
+    with transaction.atomic():
+        # // lock every selected copy, so none can become eligible (or stop
+        # // being eligible) between this read and the UPDATE
+        rows, skipped = [], []
+        for row in BookInstance.objects.select_for_update().filter(pk__in=selected).values_list(
+                'pk', 'book_id', 'status', 'due_back'):
+            if row[2] in statuses and (extend_by is None or row[3] is not None):
+                rows.append(row)
+            else:
+                skipped.append(row)
+        if not rows:
+            return rows, skipped
+        BookInstance.objects.filter(condition).update(updated_at=timezone.now(), **changes)
+
+        new_status = changes.get('status')
+        book_ids = {book_id for pk, book_id, status, due_back in rows} - {None}
+        # // a reserved copy taken off the hold shelf: its patron waits again,
+        # // at their old place in the queue
+        released = [pk for pk, book_id, status, due_back in rows if status == 'r']
+        if new_status and new_status != 'r' and released:
+            Hold.objects.filter(copy_id__in=released, status__exact='r').update(status='w', copy=None, expires_at=None)
+        moved = collections.Counter(status for pk, book_id, status, due_back in rows if status != new_status)
+        if new_status and moved:
+            for status, number in moved.items():
+                counters.increment(counters.copies_status_key(status), -number)
+            counters.increment(counters.copies_status_key(new_status), sum(moved.values()))
+            invalidate_library_stats()
+
+        # // copies back on the shelf go to the head of their book's queue
+        # // first, as in return_copy (save(): signals move the counters)
+        reserved = set()
+        if new_status == 'a':
+            waiting = Hold.objects.filter(book_id__in=book_ids, status__exact='w').values('book_id')
+            for copy in BookInstance.objects.select_for_update().filter(
+                    pk__in=[pk for pk, book_id, status, due_back in rows], book_id__in=waiting).order_by('pk'):
+                if _shelve_or_reserve(copy) is not None:
+                    reserved.add(copy.pk)
+
+        CirculationLog.objects.bulk_create([
+            CirculationLog(
+                copy_id=pk, action=action, user=user,
+                old_status=status, new_status='r' if pk in reserved else new_status or status,
+                old_due_back=due_back,
+                new_due_back=due_back + extend_by if extend_by is not None else changes.get('due_back', due_back),
+            )
+            for pk, book_id, status, due_back in rows
+        ])
+
+        touch_books(book_ids)
+        bump_generations(Book, book_ids)
+        bump_model_generation(BookInstance)
+    # // (pk, book_id, status, due_back) of the changed and of the left alone copies
+    return rows, skipped
+
+
+_CLEAR_LOAN = {'due_back': None, 'borrower': None}
+
+
+def mark_returned(queryset, user=None):
+    changed, skipped = _apply(queryset, 'returned', {'o'}, dict(_CLEAR_LOAN, status='a'), user)
+    return len(changed)
+
+
+def mark_available(queryset, user=None):
+    changed, skipped = _apply(queryset, 'available', {'m', 'o', 'r'}, dict(_CLEAR_LOAN, status='a'), user)
+    return len(changed)
+
+
+def send_to_maintenance(queryset, user=None):
+    changed, skipped = _apply(queryset, 'maintenance', {'a', 'o', 'r'}, dict(_CLEAR_LOAN, status='m'), user)
+    return len(changed)
+
+
+def extend_due_back(queryset, weeks, user=None):
+    extend_by = datetime.timedelta(weeks=weeks)
+    changes = {'due_back': ExpressionWrapper(F('due_back') + extend_by, output_field=DateField())}
+    changed, skipped = _apply(queryset, 'extended', {'o'}, changes, user, extend_by=extend_by)
+    return len(changed)
+
+
+# // batch renewal (renew_loans_librarian): one report row per requested copy
+# // (then per other copy of the queryset), (copy id, None) when renewed or
+# // (copy id, reason) when not
+def renew_loans(queryset, due_back, user=None, requested=None):
+    changed, skipped = _apply(queryset, 'renewed', {'o'}, {'due_back': due_back}, user)
+    found = {pk: 'not on loan' for pk, book_id, status, old_due_back in skipped}
+    found.update((pk, None) for pk, book_id, status, old_due_back in changed)
+    requested = list(requested or [])
+    others = [pk for pk in found if pk not in set(requested)]
+    return [(pk, found.get(pk, 'not found')) for pk in requested + others]
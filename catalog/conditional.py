@@ -0,0 +1,57 @@
+# // /catalog/conditional.py
+# // ETag/Last-Modified helpers shared by the JSON API and the detail pages.
+# // Validators come from one cheap timestamp query, checked before any
+# // rendering; a matching If-None-Match/If-Modified-Since gets a 304.
+
+import hashlib
+
+from django.http import Http404
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+# // parts: everything the response depends on; timestamps: the datetimes among them
+def compute_validators(*parts, timestamps):
+    etag = quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+    timestamps = [stamp for stamp in timestamps if stamp is not None]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+# // DetailView mixin: get_validator_stamps() returns a tuple of values
+# // (timestamps first, then e.g. counts) from one query, or None for a 404
+class ConditionalGetMixin:
+    validator_timestamps = 2
+    
+    def get_validator_stamps(self):
+        raise NotImplementedError
+    
+    def get(self, request, *args, **kwargs):
+        stamps = self.get_validator_stamps()
+        if stamps is None:
+            raise Http404(f'No {self.model._meta.verbose_name} found')
+        # // base.html differs per user (login links, staff menu); their pages
+        # // carry forms (place a hold), whose CSRF token rotates on login
+        user = request.user
+        viewer = None
+        if user.is_authenticated:
+            # // get_token() is masked anew on every call, the cookie value is not
+            get_token(request)
+            viewer = (user.pk, user.is_staff, hashlib.sha1(request.META['CSRF_COOKIE'].encode()).hexdigest())
+        # // the query string too: it picks e.g. the page of copies shown
+        etag, last_modified = compute_validators(
+            self.model._meta.label_lower, self.kwargs, sorted(request.GET.lists()), viewer, stamps,
+            timestamps=stamps[:self.validator_timestamps])
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        patch_vary_headers(response, ['Cookie'])
+        return set_validators(response, etag, last_modified)
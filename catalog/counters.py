@@ -0,0 +1,98 @@
+# // /catalog/counters.py
+# // Denormalized library counters (LibraryCounter rows).
+# // Signals in catalog/signals.py apply incremental F() updates;
+# // compute_counters()/rebuild_counters() recount everything from scratch.
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+BOOKS = 'books'
+COPIES = 'copies'
+AUTHORS = 'authors'
+
+
+def copies_status_key(status):
+    return f'copies:status:{status}'
+
+
+def books_genre_key(genre_id):
+    return f'books:genre:{genre_id}'
+
+
+def books_language_key(language_id):
+    return f'books:language:{language_id}'
+
+
+def books_author_key(author_id):
+    return f'books:author:{author_id}'
+
+
+def increment(name, delta=1):
+    if not delta:
+        return
+    LibraryCounter = django_apps.get_model('catalog', 'LibraryCounter')
+    updated = LibraryCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if updated:
+        return
+    # // first time we see this counter: create it, unless someone else just did
+    try:
+        with transaction.atomic():
+            LibraryCounter.objects.create(name=name, value=delta)
+    except IntegrityError:
+        LibraryCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def discard(name):
+    django_apps.get_model('catalog', 'LibraryCounter').objects.filter(name=name).delete()
+
+
+def read_counters():
+    # // one query, whole table: it is tiny compared to catalog_bookinstance
+    LibraryCounter = django_apps.get_model('catalog', 'LibraryCounter')
+    return dict(LibraryCounter.objects.values_list('name', 'value'))
+
+
+# // `apps` lets the data migration reuse this with historical models
+def compute_counters(apps=django_apps):
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    
+    counters = {
+        BOOKS: Book.objects.count(),
+        COPIES: BookInstance.objects.count(),
+        AUTHORS: Author.objects.count(),
+    }
+    rows = BookInstance.objects.order_by().values_list('status').annotate(n=Count('pk'))
+    counters.update((copies_status_key(status), n) for status, n in rows)
+    rows = Book.objects.filter(language__isnull=False).order_by().values_list('language').annotate(n=Count('pk'))
+    counters.update((books_language_key(language_id), n) for language_id, n in rows)
+    rows = Book.genre.through.objects.order_by().values_list('genre').annotate(n=Count('pk'))
+    counters.update((books_genre_key(genre_id), n) for genre_id, n in rows)
+    rows = Book.author.through.objects.order_by().values_list('author').annotate(n=Count('pk'))
+    counters.update((books_author_key(author_id), n) for author_id, n in rows)
+    return counters
+
+
+def rebuild_counters(apps=django_apps):
+    LibraryCounter = apps.get_model('catalog', 'LibraryCounter')
+    with transaction.atomic():
+        counters = compute_counters(apps)
+        LibraryCounter.objects.all().delete()
+        LibraryCounter.objects.bulk_create(
+            LibraryCounter(name=name, value=value) for name, value in counters.items()
+        )
+    return counters
+
+
+def counter_drift():
+    # // {name: (stored, actual)} for every counter that disagrees
+    # // (a missing row and a zero count are the same thing)
+    stored = read_counters()
+    actual = compute_counters()
+    drift = {}
+    for name in set(stored) | set(actual):
+        if stored.get(name, 0) != actual.get(name, 0):
+            drift[name] = (stored.get(name, 0), actual.get(name, 0))
+    return drift
@@ -0,0 +1,113 @@
+# // /catalog/db_router.py
+# // Read replicas for the catalog's read-only pages.
+# // settings.DATABASE_REPLICAS lists replica aliases of DATABASES (see
+# // DJANGO_REPLICA_URLS in settings.py); none configured -> everything on default.
+# //   @read_from_replica / ReplicaReadMixin   the view's catalog reads go to one
+# //                                           replica, picked per request
+# //   anything else                           primary ('default'), as are all writes
+# // Read-your-writes: a request that writes reads from the primary from then
+# // on, and ReplicaPinMiddleware keeps that visitor's reads on the primary for
+# // CATALOG_REPLICA_PIN_SECONDS (default 5) with a cookie, while replicas catch up.
+# // Caches filled from replica reads in that window are keyed apart (catalog/cache.py).
+
+import contextlib
+import functools
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_pin'
+
+_state = threading.local()
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _pin_seconds():
+    return getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS', 5)
+
+
+# // seconds a write may take to reach the replicas; 0 without replicas
+def lag_window():
+    return _pin_seconds() if _replicas() else 0
+
+
+def _current_replica():
+    replica = getattr(_state, 'replica', None)
+    if replica is None or getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False):
+        return None
+    return replica
+
+
+# // whether this thread reads, or during this request did read, the catalog
+# // from a replica, i.e. may see rows older than the primary's
+def reads_from_replica():
+    return getattr(_state, 'read_replica', False) or _current_replica() is not None
+
+
+class ReplicaRouter:
+    # // only catalog tables: sessions & users are read from the primary, so a
+    # // lagging replica never logs anyone out
+    def db_for_read(self, model, **hints):
+        replica = _current_replica()
+        if replica is None or model._meta.app_label != 'catalog':
+            # // explicit, so objects read from a replica (or unpickled from the
+            # // cache) do not drag later queries there through their hints
+            return DEFAULT_DB_ALIAS
+        _state.read_replica = True
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    # // replicas hold the same rows as the primary
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+
+@contextlib.contextmanager
+def reading_from_replica():
+    replicas = _replicas()
+    previous = getattr(_state, 'replica', None)
+    _state.replica = random.choice(replicas) if replicas else None
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_from_replica(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    def dispatch(self, request, *args, **kwargs):
+        return read_from_replica(super().dispatch)(request, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = PIN_COOKIE in request.COOKIES
+        _state.wrote = _state.read_replica = False
+        try:
+            response = self.get_response(request)
+            if _state.wrote and _replicas():
+                response.set_cookie(PIN_COOKIE, '1', max_age=_pin_seconds(), httponly=True, samesite='Lax')
+            return response
+        finally:
+            _state.pinned = _state.wrote = _state.read_replica = False
@@ -0,0 +1,97 @@
+# // /catalog/exports.py
+# // Streaming CSV/JSONL exports of books, authors and copies (loans).
+# // Rows come from values_list() projections read with .iterator(chunk_size),
+# // and are encoded one at a time, so memory stays flat whatever the table size.
+# // Book rows use the same columns as the import feed (catalog/importer.py).
+
+import csv
+import datetime
+import json
+import uuid
+
+from catalog.models import Author, Book, BookInstance
+
+CHUNK_SIZE = 2000
+
+
+def _book_rows(chunk_size):
+    # // authors/genres: two queries per chunk of books, not two per book
+    queryset = Book.objects.order_by('pk').values_list('pk', 'isbn', 'isbn13', 'title', 'summary', 'language__name')
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from _with_relations(chunk)
+            chunk = []
+    yield from _with_relations(chunk)
+
+
+def _with_relations(chunk):
+    if not chunk:
+        return
+    book_ids = [row[0] for row in chunk]
+    authors, genres = {}, {}
+    for book_id, last_name, first_name in Book.author.through.objects.filter(book_id__in=book_ids).order_by(
+            'author__last_name', 'author__first_name').values_list('book_id', 'author__last_name', 'author__first_name'):
+        authors.setdefault(book_id, []).append(f'{last_name}, {first_name}')
+    for book_id, name in Book.genre.through.objects.filter(book_id__in=book_ids).order_by(
+            'genre__name').values_list('book_id', 'genre__name'):
+        genres.setdefault(book_id, []).append(name)
+    for pk, isbn, isbn13, title, summary, language in chunk:
+        yield (pk, isbn, isbn13, title, summary, language, '|'.join(genres.get(pk, [])), '|'.join(authors.get(pk, [])))
+
+
+def _values_rows(queryset, fields, chunk_size):
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+# // kind -> (header, row generator)
+EXPORTS = {
+    'books': (
+        ['id', 'isbn', 'isbn13', 'title', 'summary', 'language', 'genres', 'authors'],
+        _book_rows,
+    ),
+    'authors': (
+        ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'],
+        lambda chunk_size: _values_rows(
+            Author.objects.order_by('pk'),
+            ['pk', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'], chunk_size),
+    ),
+    'copies': (
+        ['copy_id', 'book_id', 'title', 'imprint', 'status', 'due_back', 'borrower'],
+        lambda chunk_size: _values_rows(
+            BookInstance.objects.order_by('pk'),
+            ['pk', 'book_id', 'book__title', 'imprint', 'status', 'due_back', 'borrower__username'], chunk_size),
+    ),
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+# // the csv module only writes to files: hand it one that gives the line back
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_lines(kind, file_format, chunk_size=CHUNK_SIZE):
+    header, rows = EXPORTS[kind]
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        for row in rows(chunk_size):
+            yield writer.writerow([_plain(value) for value in row])
+    else:
+        for row in rows(chunk_size):
+            yield json.dumps(dict(zip(header, map(_plain, row))), ensure_ascii=False) + '\n'
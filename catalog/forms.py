@@ -9,19 +9,26 @@ from django.utils.translation import ugettext_lazy as _
 from django.forms import ModelForm
 from catalog.models import BookInstance
 
+# // batch renewal
+import uuid
+from django.contrib.auth.models import User
+
+
+# // renewal rule shared by the single and the batch renewal forms
+def check_renewal_date(data):
+    if data < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
+    
+    if data > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+    
+    return data
+
 
 # //m2> using ModelForm
 class RenewBookModelForm(ModelForm):
     def clean_due_back(self):
-        data = self.cleaned_data['due_back']
-        
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
-        
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
-        
-        return data
+        return check_renewal_date(self.cleaned_data['due_back'])
     
     class Meta:
         model = BookInstance
@@ -49,3 +56,84 @@ class RenewBookForm(forms.Form):
         return data
     
 
+
+# // "extend due date" admin action (catalog/admin.py)
+class ExtendDueBackForm(forms.Form):
+    weeks = forms.IntegerField(min_value=1, max_value=4, initial=1, help_text="Extend by 1 to 4 weeks.")
+
+
+# // any well-formed copy id; unknown copies show up in the renewal report
+class CopyIdsField(forms.TypedMultipleChoiceField):
+    def __init__(self, **kwargs):
+        super().__init__(coerce=uuid.UUID, **kwargs)
+    
+    def valid_value(self, value):
+        return True
+
+
+# // batch renewal: the loans ticked on the all-loans page, or every loan of one borrower
+class BatchRenewForm(forms.Form):
+    due_back = forms.DateField(label=_('New renewal date'), help_text=_('Enter a date between now and 4 weeks (default 3).'))
+    copies = CopyIdsField(required=False)
+    borrower = forms.CharField(required=False, max_length=150, help_text=_('Username: renew all of their loans.'))
+    
+    def clean_due_back(self):
+        return check_renewal_date(self.cleaned_data['due_back'])
+    
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower']
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise ValidationError(_('Unknown borrower'))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('copies') and not cleaned_data.get('borrower') and not self.errors:
+            raise ValidationError(_('Select loans or enter a borrower'))
+        return cleaned_data
+
+
+# // circulation desk (page & JSON): checkout a copy (or any copy of a book),
+# // return it, renew it
+class CirculationForm(forms.Form):
+    ACTIONS = (
+        ('checkout', _('Check out')),
+        ('return', _('Return')),
+        ('renew', _('Renew')),
+    )
+    
+    action = forms.ChoiceField(choices=ACTIONS)
+    copy = forms.UUIDField(required=False, help_text=_('Copy id (scanned).'))
+    book = forms.IntegerField(required=False, min_value=1, help_text=_('Check out any available copy of this book.'))
+    borrower = forms.CharField(required=False, max_length=150, help_text=_('Username of the borrower.'))
+    due_back = forms.DateField(required=False, help_text=_('Enter a date between now and 4 weeks (default 3).'))
+    
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower']
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise ValidationError(_('Unknown borrower'))
+    
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        return check_renewal_date(data) if data else None
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action == 'checkout':
+            if not cleaned_data.get('copy') and not cleaned_data.get('book'):
+                raise ValidationError(_('Enter a copy or a book'))
+            if not cleaned_data.get('borrower') and 'borrower' not in self.errors:
+                self.add_error('borrower', _('This field is required.'))
+        elif action in ('return', 'renew') and not cleaned_data.get('copy') and 'copy' not in self.errors:
+            self.add_error('copy', _('This field is required.'))
+        if action == 'renew' and not cleaned_data.get('due_back') and 'due_back' not in self.errors:
+            self.add_error('due_back', _('This field is required.'))
+        return cleaned_data
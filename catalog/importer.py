@@ -0,0 +1,289 @@
+# // /catalog/importer.py
+# // Streaming bulk import of the catalog feed, used by `manage.py import_catalog`.
+# // One record = one book (by ISBN), optionally with one copy:
+# //   isbn, title, summary, language, genres, authors, copy_id, imprint, status, due_back
+# // CSV lists are '|'-separated ("Fantasy|Classic", "Tolkien, John|Lewis, C. S.");
+# // JSONL may use real lists. Records are read lazily and written in batches,
+# // one transaction per batch, so memory use does not depend on the file size.
+# // Books already in the catalog (same ISBN) are kept as they are; only new
+# // author/genre links and copies are added to them.
+
+import collections
+import csv
+import datetime
+import json
+import os
+import time
+import uuid
+
+from django.db import transaction
+
+from catalog import counters, search
+from catalog.cache import LIST, bump_generation, bump_generations, bump_model_generation
+from catalog.isbn import normalize_isbn
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.signals import touch_books
+from catalog.stats import invalidate_library_stats
+
+STATUSES = {status for status, label in BookInstance.LOAN_STATUS}
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_records(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        # // decoded by parse_record(), so one malformed line is skipped like any bad record
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def _split(value):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in (value or '').split('|') if item.strip()]
+
+
+def _author_key(name):
+    # // "Last, First" (or "First Last") -> (last_name, first_name)
+    if ',' in name:
+        last_name, first_name = name.split(',', 1)
+    else:
+        first_name, _, last_name = name.rpartition(' ')
+    return last_name.strip()[:100], first_name.strip()[:100]
+
+
+def parse_record(record):
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as error:
+            raise RecordError(f'invalid JSON: {error}')
+    isbn13 = normalize_isbn(record.get('isbn'))
+    if not isbn13:
+        raise RecordError(f'invalid ISBN {record.get("isbn")!r}')
+    title = (record.get('title') or '').strip()
+    if not title:
+        raise RecordError(f'missing title for ISBN {isbn13}')
+
+    copy = None
+    if record.get('copy_id') or record.get('imprint'):
+        status = (record.get('status') or 'm').strip()
+        if status not in STATUSES:
+            raise RecordError(f'invalid status {status!r}')
+        try:
+            copy_id = uuid.UUID(record['copy_id']) if record.get('copy_id') else uuid.uuid4()
+            due_back = datetime.date.fromisoformat(record['due_back']) if record.get('due_back') else None
+        except ValueError as error:
+            raise RecordError(str(error))
+        copy = {
+            'id': copy_id,
+            'imprint': (record.get('imprint') or '').strip()[:200],
+            'status': status,
+            'due_back': due_back,
+        }
+
+    isbn = (record.get('isbn') or '').strip()
+    return {
+        # // keep the feed's ISBN unless it does not fit (hyphenated ISBN-13)
+        'isbn': isbn if len(isbn) <= 13 else isbn13,
+        'isbn13': isbn13,
+        'title': title[:200],
+        'summary': (record.get('summary') or '').strip()[:1000],
+        'language': (record.get('language') or '').strip()[:200] or None,
+        'genres': [name[:200] for name in _split(record.get('genres'))],
+        'authors': [_author_key(name) for name in _split(record.get('authors'))],
+        'copy': copy,
+    }
+
+
+class CatalogImporter:
+    # // past this many entries the author/book caches are dropped and refilled
+    # // from the database, so a feed of millions of titles stays within bounds
+    cache_limit = 200000
+    
+    def __init__(self, batch_size=1000, on_batch=None):
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        # // in-memory lookup caches: name/key -> primary key
+        self.languages = dict(Language.objects.values_list('name', 'pk'))
+        self.genres = dict(Genre.objects.values_list('name', 'pk'))
+        self.authors = {}
+        self.books = {}
+        self.stats = {'records': 0, 'books': 0, 'copies': 0, 'skipped': 0}
+        self.errors = []
+        self.started = time.monotonic()
+
+    # // records: iterable of raw dicts; skip: records already imported (resume)
+    def run(self, records, skip=0):
+        batch, position, flushed = [], skip, skip
+        for position, record in enumerate(records, 1):
+            if position <= skip:
+                continue
+            try:
+                batch.append(parse_record(record))
+            except (RecordError, AttributeError, TypeError) as error:
+                self.stats['skipped'] += 1
+                self.errors.append((position, str(error)))
+            if position % self.batch_size == 0:
+                self._flush(batch, position)
+                batch, flushed = [], position
+        if position > flushed:
+            self._flush(batch, position)
+        self.finish()
+        return self.stats
+
+    def _flush(self, batch, position):
+        with transaction.atomic():
+            self._write_batch(batch)
+        self.stats['records'] = position
+        if self.on_batch:
+            self.on_batch(position, self.stats, self.rate())
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.stats['records'] / elapsed if elapsed else 0.0
+
+    # //=====================================
+    # // upserts through the lookup caches
+    # //=====================================
+    def _upsert_names(self, model, cache, names):
+        missing = {name for name in names if name and name not in cache}
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing])
+            cache.update(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def _upsert_authors(self, keys):
+        missing = {key for key in keys if key not in self.authors}
+        if not missing:
+            return 0
+        found = Author.objects.filter(last_name__in={last for last, first in missing}).values_list(
+            'last_name', 'first_name', 'pk')
+        for last_name, first_name, pk in found:
+            self.authors.setdefault((last_name, first_name), pk)
+        new = missing - set(self.authors)
+        if new:
+            Author.objects.bulk_create([Author(last_name=last, first_name=first) for last, first in new])
+            found = Author.objects.filter(last_name__in={last for last, first in new}).values_list(
+                'last_name', 'first_name', 'pk')
+            for last_name, first_name, pk in found:
+                self.authors.setdefault((last_name, first_name), pk)
+        return len(new)
+
+    def _upsert_books(self, rows):
+        missing = {row['isbn13']: row for row in rows if row['isbn13'] not in self.books}
+        if not missing:
+            return []
+        self.books.update(Book.objects.filter(isbn13__in=missing).values_list('isbn13', 'pk'))
+        new = [row for isbn13, row in missing.items() if isbn13 not in self.books]
+        Book.objects.bulk_create([
+            Book(
+                title=row['title'], summary=row['summary'], isbn=row['isbn'], isbn13=row['isbn13'],
+                language_id=self.languages.get(row['language']),
+            )
+            for row in new
+        ])
+        created = dict(Book.objects.filter(isbn13__in=[row['isbn13'] for row in new]).values_list('isbn13', 'pk'))
+        self.books.update(created)
+        self.stats['books'] += len(created)
+        return list(created.values())
+
+    def _write_batch(self, rows):
+        if not rows:
+            return
+        for cache in (self.authors, self.books):
+            if len(cache) > self.cache_limit:
+                cache.clear()
+        self._upsert_names(Language, self.languages, {row['language'] for row in rows})
+        self._upsert_names(Genre, self.genres, {name for row in rows for name in row['genres']})
+        new_authors = self._upsert_authors({key for row in rows for key in row['authors']})
+        new_book_ids = self._upsert_books(rows)
+
+        book_authors, book_genres = set(), set()
+        for row in rows:
+            book_id = self.books[row['isbn13']]
+            book_authors.update((book_id, self.authors[key]) for key in row['authors'])
+            book_genres.update((book_id, self.genres[name]) for name in row['genres'])
+        author_ids = {author_id for book_id, author_id in book_authors}
+        # // links and copies already in the database (re-run, overlapping feed)
+        # // are left alone by ignore_conflicts; found first, so only the rows
+        # // really inserted are counted
+        book_authors -= set(Book.author.through.objects.filter(
+            book_id__in={book_id for book_id, author_id in book_authors},
+        ).values_list('book_id', 'author_id'))
+        book_genres -= set(Book.genre.through.objects.filter(
+            book_id__in={book_id for book_id, genre_id in book_genres},
+        ).values_list('book_id', 'genre_id'))
+        Book.author.through.objects.bulk_create(
+            [Book.author.through(book_id=book_id, author_id=author_id) for book_id, author_id in book_authors],
+            ignore_conflicts=True,
+        )
+        Book.genre.through.objects.bulk_create(
+            [Book.genre.through(book_id=book_id, genre_id=genre_id) for book_id, genre_id in book_genres],
+            ignore_conflicts=True,
+        )
+
+        copies = {}
+        for row in rows:
+            if row['copy']:
+                copies.setdefault(row['copy']['id'], BookInstance(book_id=self.books[row['isbn13']], **row['copy']))
+        for pk in BookInstance.objects.filter(pk__in=list(copies)).values_list('pk', flat=True):
+            del copies[pk]
+        BookInstance.objects.bulk_create(list(copies.values()), ignore_conflicts=True)
+        self.stats['copies'] += len(copies)
+
+        # // bulk_create sends no signals: counters move by what this batch
+        # // added, in its transaction, as circulation._apply does
+        new_books = set(new_book_ids)
+        languages = {self.books[row['isbn13']]: self.languages.get(row['language']) for row in rows}
+        deltas = collections.Counter({counters.BOOKS: len(new_books), counters.AUTHORS: new_authors})
+        deltas[counters.COPIES] += len(copies)
+        deltas.update(counters.copies_status_key(copy.status) for copy in copies.values())
+        deltas.update(
+            counters.books_language_key(language_id)
+            for book_id, language_id in languages.items() if book_id in new_books and language_id is not None
+        )
+        deltas.update(counters.books_author_key(author_id) for book_id, author_id in book_authors)
+        deltas.update(counters.books_genre_key(genre_id) for book_id, genre_id in book_genres)
+        deltas = +deltas
+        for name, delta in sorted(deltas.items()):
+            counters.increment(name, delta)
+        if deltas:
+            invalidate_library_stats()
+
+        # // and the search index
+        search.index_books(new_books | {book_id for book_id, author_id in book_authors})
+        # // existing books may have gained authors, genres or copies: their
+        # // Last-Modified/ETag, cached fragments and cached pages must change
+        book_ids = {self.books[row['isbn13']] for row in rows}
+        touch_books(book_ids)
+        bump_generations(Book, book_ids)
+        if new_book_ids:
+            bump_generation(Book, LIST)
+        bump_generations(Author, author_ids)
+
+    # // cached values keyed by model generations (counters are kept per batch;
+    # // `manage.py rebuild_library_stats` recounts them if ever needed)
+    def finish(self):
+        for model in (Author, Book, BookInstance, Genre, Language):
+            bump_model_generation(model)
+
+
+def read_checkpoint(path, source):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        data = json.load(checkpoint)
+    return data['records'] if data.get('source') == os.path.abspath(source) else 0
+
+
+def write_checkpoint(path, source, records):
+    # // write-then-rename, so a crash never leaves a half-written checkpoint
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as checkpoint:
+        json.dump({'source': os.path.abspath(source), 'records': records}, checkpoint)
+    os.replace(temporary, path)
@@ -0,0 +1,29 @@
+# // /catalog/isbn.py
+# // ISBN normalization: every valid ISBN-10/ISBN-13 becomes its ISBN-13 form,
+# // e.g. '0-306-40615-2' -> '9780306406157'. Anything else -> None.
+
+import re
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_is_valid(isbn10):
+    digits = [10 if char == 'X' else int(char) for char in isbn10]
+    return sum(weight * digit for weight, digit in zip(range(10, 0, -1), digits)) % 11 == 0
+
+
+def normalize_isbn(value):
+    if not value:
+        return None
+    isbn = re.sub(r'[\s-]', '', str(value)).upper()
+    if re.fullmatch(r'[0-9]{9}[0-9X]', isbn):
+        if not _isbn10_is_valid(isbn):
+            return None
+        first12 = '978' + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+    if re.fullmatch(r'97[89][0-9]{10}', isbn):
+        return isbn if _isbn13_check_digit(isbn[:12]) == isbn[12] else None
+    return None
@@ -0,0 +1,26 @@
+# // /catalog/management/commands/cache_stats.py
+# // python manage.py cache_stats          -> hits/misses of each cached value (catalog/cache.py)
+# // python manage.py cache_stats --reset  -> print them, then start counting from zero
+
+from django.core.management.base import BaseCommand
+
+from catalog.cache import cache_metrics, reset_cache_metrics
+
+
+class Command(BaseCommand):
+    help = 'Report hit/miss counts of the catalog caches.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counts after reporting them.')
+        
+    def handle(self, *args, **options):
+        metrics = cache_metrics()
+        for name, counts in metrics.items():
+            total = counts['hits'] + counts['misses']
+            ratio = counts['hits'] / total if total else 0
+            self.stdout.write(f"{name}: {counts['hits']} hits, {counts['misses']} misses ({ratio:.0%} hit rate)")
+        if not metrics:
+            self.stdout.write('No cache activity recorded.')
+        if options['reset']:
+            reset_cache_metrics()
+            self.stdout.write(self.style.SUCCESS('Counts reset.'))
@@ -0,0 +1,18 @@
+# // /catalog/management/commands/expire_holds.py
+# // python manage.py expire_holds  -> pass reserved copies nobody picked up
+# // in time on to the next patron in line (run it from cron)
+
+from django.core.management.base import BaseCommand
+
+from catalog.circulation import expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Expire holds that were not picked up in time and re-allocate their copies.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        
+    def handle(self, *args, **options):
+        expired = expire_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} holds.'))
@@ -0,0 +1,27 @@
+# // /catalog/management/commands/export_catalog.py
+# // python manage.py export_catalog books                      -> CSV on stdout
+# // python manage.py export_catalog copies --format jsonl -o copies.jsonl
+
+from django.core.management.base import BaseCommand
+
+from catalog.exports import CHUNK_SIZE, EXPORTS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream books, authors or copies as CSV or JSONL.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        
+    def handle(self, *args, **options):
+        lines = export_lines(options['kind'], options['format'], options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
@@ -0,0 +1,52 @@
+# // /catalog/management/commands/import_catalog.py
+# // python manage.py import_catalog feed.csv
+# // python manage.py import_catalog feed.jsonl --batch-size 5000 --checkpoint feed.ckpt
+# // (re-run the same command after a failure: it resumes after the last committed batch)
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, read_checkpoint, read_records, write_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL catalog feed into Book, Author, Genre, Language and BookInstance.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000, help='records per transaction')
+        parser.add_argument('--checkpoint', help='file recording progress, for resuming')
+        parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+        
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint']
+        skip = 0 if options['restart'] else read_checkpoint(checkpoint, path)
+        if skip:
+            self.stdout.write(f'Resuming after record {skip}.')
+            
+        def on_batch(records, stats, rate):
+            if checkpoint:
+                write_checkpoint(checkpoint, path, records)
+            self.stdout.write(
+                f'{records} records, {stats["books"]} new books, {stats["copies"]} copies, '
+                f'{stats["skipped"]} skipped ({rate:.0f} records/s)'
+            )
+            
+        importer = CatalogImporter(batch_size=options['batch_size'], on_batch=on_batch)
+        with open(path, newline='', encoding='utf-8') as stream:
+            stats = importer.run(read_records(stream, file_format), skip=skip)
+            
+        for position, error in importer.errors[:20]:
+            self.stderr.write(f'record {position}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["books"]} books and {stats["copies"]} copies '
+            f'from {stats["records"]} records ({stats["skipped"]} skipped).'
+        ))
@@ -0,0 +1,35 @@
+# // /catalog/management/commands/rebuild_library_stats.py
+# // python manage.py rebuild_library_stats          -> recount & replace LibraryCounter rows
+# // python manage.py rebuild_library_stats --check  -> only report drift (exit 1 if any)
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.counters import counter_drift, rebuild_counters
+from catalog.stats import invalidate_library_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized library counters from scratch, or check them for drift.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Report counters that disagree with the catalog tables without changing them.',
+        )
+        
+    def handle(self, *args, **options):
+        drift = counter_drift()
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'{name}: stored {stored}, actual {actual}')
+            
+        if options['check']:
+            if drift:
+                raise CommandError(f'{len(drift)} counter(s) drifted.')
+            self.stdout.write(self.style.SUCCESS('Counters are in sync.'))
+            return
+        
+        counters = rebuild_counters()
+        invalidate_library_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(counters)} counters ({len(drift)} had drifted).'
+        ))
@@ -0,0 +1,20 @@
+# // /catalog/management/commands/rebuild_search_index.py
+# // python manage.py rebuild_search_index  -> re-index every Book for full-text search
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from catalog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of all books.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options['database']):
+            total = rebuild_index(using=options['database'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} books.'))
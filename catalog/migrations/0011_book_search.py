@@ -0,0 +1,26 @@
+# Full-text search structures for Book (see catalog/search.py):
+# a tsvector column + GIN index on PostgreSQL, an FTS5 table on SQLite.
+
+from django.db import migrations
+
+
+def create_search(apps, schema_editor):
+    from catalog.search import create_search_structures, rebuild_index
+    create_search_structures(schema_editor)
+    rebuild_index(using=schema_editor.connection.alias, apps=apps)
+
+
+def drop_search(apps, schema_editor):
+    from catalog.search import drop_search_structures
+    drop_search_structures(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+def populate_isbn13(apps, schema_editor):
+    # // the first book keeps a duplicated ISBN, later duplicates stay NULL
+    from catalog.isbn import normalize_isbn
+    Book = apps.get_model('catalog', 'Book')
+    seen = set()
+    for book in Book.objects.order_by('pk').only('pk', 'isbn').iterator():
+        isbn13 = normalize_isbn(book.isbn)
+        if isbn13 and isbn13 not in seen:
+            seen.add(isbn13)
+            Book.objects.filter(pk=book.pk).update(isbn13=isbn13)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_book_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, unique=True, verbose_name='normalized ISBN'),
+        ),
+        migrations.RunPython(populate_isbn13, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_circulationlog_renewed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='circulationlog',
+            name='action',
+            field=models.CharField(choices=[('checked_out', 'Checked out'), ('returned', 'Marked returned'), ('available', 'Marked available'), ('maintenance', 'Sent to maintenance'), ('extended', 'Due date extended'), ('renewed', 'Renewed')], max_length=20),
+        ),
+    ]
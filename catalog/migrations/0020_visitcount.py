@@ -0,0 +1,29 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'page'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='visitcount',
+            constraint=models.UniqueConstraint(fields=('page', 'day'), name='visit_page_day_unique'),
+        ),
+    ]
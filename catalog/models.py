@@ -1,5 +1,7 @@
 # // catalog/models.py
 # // 5 models: Genre, Language, Author, Book, BookInstance
+# // + LibraryCounter (denormalized counts), CirculationLog (circulation history),
+# //   Hold (patrons queueing for a title), VisitCount (page visits per day)
 
 from django.db import models
 from django.urls import reverse
@@ -11,6 +13,10 @@ from django.contrib.auth.models import User
 import uuid
 from datetime import date
 
+# // normalized, uniquely indexed ISBN
+from django.core.exceptions import ValidationError
+from catalog.isbn import normalize_isbn
+
 
 # // a book Gernre model //
 class Genre(models.Model):
@@ -40,10 +46,14 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    # // HTTP validators (ETag/Last-Modified) of the JSON API
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # //Metadata: control how the data is stored or used
     class Meta:
         ordering = ['last_name', 'first_name']
+        # // keyset pagination key of AuthorListView (catalog/pagination.py)
+        indexes = [models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_keyset_idx')]
     
     # //Methods: 
     def get_absolute_url(self):
@@ -58,6 +68,12 @@ class Book(models.Model):
     title = models.CharField(max_length=200)
     summary = models.TextField(max_length=1000, help_text='Enter a brief description of the book')
     isbn = models.CharField('ISBN', max_length=13, help_text='13 Characters <a href="https://www.isbn-international.org/content/what-isbn">ISBN number</a>')
+    # // ISBN-13 form of `isbn` (ISBN-10 converted), None if `isbn` is not a valid ISBN
+    # // set in save(); used by scanners & the availability API
+    isbn13 = models.CharField('normalized ISBN', max_length=13, unique=True, null=True, blank=True, editable=False)
+    # // HTTP validators (ETag/Last-Modified); also touched when the book's
+    # // authors/genres change (catalog/signals.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # // 1(language)-to-many(books) & 1(book)-to-1(native-language)
     language = models.ForeignKey(Language, on_delete=models.SET_NULL, null=True)
@@ -67,8 +83,10 @@ class Book(models.Model):
     # author = models.ForeignKey(Author, on_delete=models.SET_NULL, null=True)
     # // should named as 'authors' since many-authors
     author = models.ManyToManyField(Author, help_text='Select author/authors for this book')
+    # // slice the list, not the queryset: .all()[:3] would ignore
+    # // prefetch_related('author') and run one query per book
     def display_author(self):
-        return ', '.join([author.last_name for author in self.author.all()[:3]])
+        return ', '.join([author.last_name for author in list(self.author.all())[:3]])
     display_author.short_description = 'Author'
     
      # //p6> to display All authors in book_list.html 
@@ -79,9 +97,25 @@ class Book(models.Model):
                          
     genre = models.ManyToManyField(Genre, help_text='Select genre/genres for this book')
     def display_genre(self):
-        return ', '.join([genre.name for genre in self.genre.all()[:3]])
+        return ', '.join([genre.name for genre in list(self.genre.all())[:3]])
     display_genre.short_description = 'Genre'
       
+    class Meta:
+        # // keyset pagination key of BookListView (catalog/pagination.py)
+        indexes = [models.Index(fields=['title', 'id'], name='book_title_keyset_idx')]
+    
+    def clean(self):
+        isbn13 = normalize_isbn(self.isbn)
+        if isbn13 and Book.objects.filter(isbn13=isbn13).exclude(pk=self.pk).exists():
+            raise ValidationError({'isbn': 'A book with this ISBN already exists.'})
+    
+    def save(self, *args, **kwargs):
+        self.isbn13 = normalize_isbn(self.isbn)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'isbn' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'isbn13'}
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return reverse('book-detail-url', args=[str(self.id)])
     
@@ -114,21 +148,112 @@ class BookInstance(models.Model):
     )
     
     status = models.CharField(max_length=1, choices=LOAN_STATUS, blank=True, default='m', help_text='Book availability')
+    # // saving/deleting a copy also touches its Book.updated_at (catalog/signals.py)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['due_back']
         # // p8> must has comma after 1st permission
         # // otherwise will show error: ValueError: too many values to unpack (expected 2)
         permissions = (("can_mark_returned", "Set book as returned"),)
+        # // indexes for the loan query paths (+ id for keyset pagination):
+        # // LoanedBooksByUserListView: borrower=user, status='o' ORDER BY due_back
+        # // AllLoanedBooksView: status='o' ORDER BY due_back (partial: loans only)
+        # // available copies (per book): index stats, availability API (partial)
+        indexes = [
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='copy_borrower_loans_idx'),
+            models.Index(fields=['due_back', 'id'], name='copy_on_loan_due_idx', condition=models.Q(status='o')),
+            models.Index(fields=['book'], name='copy_available_idx', condition=models.Q(status='a')),
+        ]
         
     def __str__(self):
         # return '{0} ({1})'.format(self.id, self.book.title)
         return f'{self.id} ({self.book.title})'
-        
+
+
+# // denormalized library counters, one row per counter name
+# // e.g. 'books', 'copies', 'copies:status:a', 'books:genre:3'
+# // kept up to date by catalog/signals.py, rebuilt by `manage.py rebuild_library_stats`
+class LibraryCounter(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
     
+    class Meta:
+        ordering = ['name']
+        
+    def __str__(self):
+        return f'{self.name} = {self.value}'
+
+
+# // one row per copy changed by a circulation action (catalog/circulation.py)
+class CirculationLog(models.Model):
+    ACTIONS = (
+        ('checked_out', 'Checked out'),
+        ('returned', 'Marked returned'),
+        ('available', 'Marked available'),
+        ('maintenance', 'Sent to maintenance'),
+        ('extended', 'Due date extended'),
+        ('renewed', 'Renewed'),
+    )
     
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True)
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    old_status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS, blank=True)
+    new_status = models.CharField(max_length=1, choices=BookInstance.LOAN_STATUS, blank=True)
+    old_due_back = models.DateField(null=True, blank=True)
+    new_due_back = models.DateField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
+    class Meta:
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f'{self.get_action_display()}: {self.copy_id}'
+
+
+# // a patron waiting for a title; the queue of a book is its waiting holds
+# // in (created_at, id) order. On return a copy goes to the head of the queue
+# // and is reserved ('r') for that patron until expires_at (catalog/circulation.py)
+class Hold(models.Model):
+    HOLD_STATUS = (
+        ('w', 'Waiting'),
+        ('r', 'Ready for pickup'),
+        ('f', 'Fulfilled'),
+        ('x', 'Expired'),
+        ('c', 'Cancelled'),
+    )
     
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    patron = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default='w')
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        ordering = ['created_at', 'id']
+        # // head of a book's queue / queue position: a range of hold_queue_idx;
+        # // stale pickups: a range of hold_pickup_idx
+        indexes = [
+            models.Index(fields=['book', 'created_at', 'id'], name='hold_queue_idx', condition=models.Q(status='w')),
+            models.Index(fields=['expires_at'], name='hold_pickup_idx', condition=models.Q(status='r')),
+            models.Index(fields=['patron', 'status'], name='hold_patron_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.book} ({self.patron})'
+
+
+# // visits per page and day, written in batches by catalog/visits.py
+class VisitCount(models.Model):
+    page = models.CharField(max_length=100)
+    day = models.DateField()
+    count = models.BigIntegerField(default=0)
     
-    
\ No newline at end of file
+    class Meta:
+        ordering = ['-day', 'page']
+        constraints = [models.UniqueConstraint(fields=['page', 'day'], name='visit_page_day_unique')]
+        
+    def __str__(self):
+        return f'{self.page} {self.day}: {self.count}'
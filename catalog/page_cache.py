@@ -0,0 +1,92 @@
+# // /catalog/page_cache.py
+# // Whole-response cache for anonymous catalog browsing (book/author lists and
+# // detail pages), keyed by path + query string.
+# // A page records the objects it shows (PageCacheMixin); the entry stores their
+# // generations (catalog/cache.py) and is only served while none of them was
+# // bumped, so e.g. saving a book retires its detail page, the list pages
+# // showing it and its authors' pages, and nothing else.
+# // Requests with a session cookie of a logged-in user (patrons, staff) and
+# // anything but GET go straight to the view. A hit does no database query.
+# // settings.CATALOG_PAGE_CACHE_TIMEOUT: seconds an entry may live (default 300)
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from catalog.cache import LIST, count_lookup, get_object_generations
+
+
+class PageCacheMixin:
+    # // (model, pk) pairs the page shows; (model, LIST) when it lists the model
+    def get_page_cache_dependencies(self, context):
+        if hasattr(self, 'object'):
+            return [(self.model, self.object.pk)]
+        return [(self.model, LIST)] + [(self.model, obj.pk) for obj in context['object_list']]
+
+    def render_to_response(self, context, **response_kwargs):
+        self.request.page_cache_dependencies = self.get_page_cache_dependencies(context)
+        return super().render_to_response(context, **response_kwargs)
+
+
+def _page_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'catalog:page:{digest}'
+
+
+def _is_anonymous(request):
+    # // no session cookie: anonymous, without loading the session
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+# // responses that are the same for every anonymous visitor
+def _is_shared(request, response):
+    session = getattr(request, 'session', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not (session is not None and session.modified)
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+# // after AuthenticationMiddleware
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'GET' or not _is_anonymous(request):
+            return self.get_response(request)
+
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            dependencies, generations, response = entry
+            if get_object_generations(dependencies) == generations:
+                count_lookup('page', True)
+                return get_conditional_response(
+                    request, etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+                    response=response,
+                )
+        count_lookup('page', False)
+
+        response = self.get_response(request)
+        dependencies = getattr(request, 'page_cache_dependencies', None)
+        if dependencies and _is_shared(request, response):
+            # // logged-in users get their own page for the same URL
+            patch_vary_headers(response, ['Cookie'])
+            # // a write between the view's queries and this read is only
+            # // noticed on the next one: the timeout bounds that window
+            # // rendered from a replica right after a write: the generations are
+            # // keyed apart (catalog/cache.py), so the entry is never served
+            generations = get_object_generations(dependencies)
+            cache.set(key, (dependencies, generations, response), getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 300))
+        return response
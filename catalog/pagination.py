@@ -0,0 +1,283 @@
+# // /catalog/pagination.py
+# // Keyset (cursor) pagination for the catalog list views.
+# // Instead of OFFSET n, each page asks for the rows after (or before) the
+# // ordering key of the last (first) row it showed, e.g. (last_name, first_name, id).
+# // Page 10,000 costs the same as page 1 and no COUNT(*) is run.
+# // Also: CachedCountPaginator, an offset paginator whose COUNT(*) is cached
+# // (and estimated on PostgreSQL for big tables).
+
+import base64
+import binascii
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from catalog.cache import get_model_generations
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+# // rows "beyond" value when walking upward (NULL sorts lowest)
+# // or downward (NULL sorts highest), see _order_expressions()
+def _beyond(name, value, upward):
+    if upward:
+        return Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__gt': value})
+    if value is None:
+        return Q(pk__in=[])
+    return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+
+
+def _same(name, value):
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1], forward=True)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0], forward=False)
+        return None
+
+
+class KeysetPaginator:
+    # // ordering: field names, ascending or '-descending', ending with a unique key (pk)
+    # // not_null: nullable fields the queryset already filters to NOT NULL
+    def __init__(self, object_list, per_page, ordering, not_null=()):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = list(ordering)
+        if self.ordering[-1].lstrip('-') not in ('pk', 'id'):
+            self.ordering.append('pk')
+        opts = object_list.model._meta
+        self._fields = [
+            (name.lstrip('-'), not name.startswith('-'), opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-')))
+            for name in self.ordering
+        ]
+        self._not_null = set(not_null)
+
+    def _nullable(self, name, field):
+        return field.null and name not in self._not_null
+
+    def _key(self, obj):
+        return [getattr(obj, field.attname) for name, ascending, field in self._fields]
+
+    def encode_cursor(self, obj, forward):
+        payload = {'k': [_json_value(value) for value in self._key(obj)], 'd': 'n' if forward else 'p'}
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(raw.decode())
+            values, direction = payload['k'], payload['d']
+            if len(values) != len(self._fields) or direction not in ('n', 'p'):
+                raise InvalidCursor(cursor)
+            key = [
+                None if value is None else field.to_python(value)
+                for value, (name, ascending, field) in zip(values, self._fields)
+            ]
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError):
+            raise InvalidCursor(cursor)
+        return key, direction == 'n'
+
+    # // nullable keys: ascending puts NULLs first, descending NULLs last, the
+    # // same on every backend; NOT NULL keys get no NULLS clause, so the order
+    # // matches the plain btree indexes (book_title_keyset_idx...) and PostgreSQL
+    # // reads the page straight off the index. A previous page walks the reverse order
+    def _order_expressions(self, reverse):
+        expressions = []
+        for name, ascending, field in self._fields:
+            nullable = self._nullable(name, field)
+            if ascending != reverse:
+                expressions.append(F(name).asc(nulls_first=True) if nullable else F(name).asc())
+            else:
+                expressions.append(F(name).desc(nulls_last=True) if nullable else F(name).desc())
+        return expressions
+
+    # // (a, b, pk) after (x, y, z) == a > x OR (a = x AND (b > y OR (b = y AND pk > z)))
+    def _seek(self, key, forward):
+        condition = None
+        for (name, ascending, field), value in reversed(list(zip(self._fields, key))):
+            step = _beyond(name, value, upward=(ascending == forward))
+            if condition is not None:
+                step |= _same(name, value) & condition
+            condition = step
+        # // redundant range on the leading column so the index can seek to it
+        name, ascending, field = self._fields[0]
+        if key[0] is not None and ascending == forward:
+            condition &= Q(**{f'{name}__gte': key[0]})
+        elif key[0] is not None and not self._nullable(name, field):
+            condition &= Q(**{f'{name}__lte': key[0]})
+        elif key[0] is not None:
+            condition &= Q(**{f'{name}__lte': key[0]}) | Q(**{f'{name}__isnull': True})
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.object_list
+        forward = True
+        if cursor:
+            key, forward = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._seek(key, forward))
+        queryset = queryset.order_by(*self._order_expressions(reverse=not forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return KeysetPage(rows, self, has_next=has_more, has_previous=bool(cursor))
+        rows.reverse()
+        return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+
+
+# // ListView mixin: keyset pagination when the request carries ?cursor=, offset
+# // pagination when it carries ?page= (old links, jumping to a page number),
+# // otherwise settings.CATALOG_PAGINATION ('keyset' in settings.py, 'offset' if unset)
+class KeysetPaginationMixin:
+    cursor_kwarg = 'cursor'
+    # // defaults to the model's Meta.ordering (+ pk)
+    keyset_ordering = None
+    # // nullable ordering fields get_queryset() filters to NOT NULL: their
+    # // ORDER BY then has no NULLS clause and matches a plain index
+    keyset_not_null = ()
+
+    def use_keyset_pagination(self):
+        if self.cursor_kwarg in self.request.GET:
+            return True
+        if self.page_kwarg in self.request.GET:
+            return False
+        return getattr(settings, 'CATALOG_PAGINATION', 'offset') == 'keyset'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering or self.model._meta.ordering or ['pk']
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering(), self.keyset_not_null)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+# //=====================================
+# // cached / estimated counts
+# //=====================================
+
+def _estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    with connection.cursor() as cursor:
+        if not query.where and not query.distinct and not query.is_sliced:
+            # // whole table: the planner's row estimate, kept by ANALYZE/autovacuum
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            estimate = row[0] if row else None
+        else:
+            sql, params = query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]['Plan']['Plan Rows']
+    # // reltuples is -1 for a table that was never analyzed
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
+# // settings:
+# //   CATALOG_COUNT_CACHE_TIMEOUT        seconds a count is reused (default 30)
+# //   CATALOG_COUNT_ESTIMATE_THRESHOLD   PostgreSQL only: above this many rows
+# //                                      (estimated) use the estimate (default 100000)
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        queryset = self.object_list
+        sql, params = queryset.query.sql_with_params()
+        # // every save/delete of the model bumps its generation (catalog/signals.py),
+        # // so cached counts go stale on writes, not only on the TTL
+        generation, = get_model_generations([queryset.model])
+        digest = hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+        key = f'catalog:count:{queryset.db}:{generation}:{digest}'
+
+        count = cache.get(key)
+        if count is None:
+            threshold = getattr(settings, 'CATALOG_COUNT_ESTIMATE_THRESHOLD', 100000)
+            count = _estimated_count(queryset)
+            if count is None or count < threshold:
+                count = queryset.count()
+            cache.set(key, count, getattr(settings, 'CATALOG_COUNT_CACHE_TIMEOUT', 30))
+        return count
+
+
+# // offset paginator for when the total is already known (e.g. from an
+# // aggregate the view runs anyway), so no COUNT(*) is issued
+class KnownCountPaginator(Paginator):
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
@@ -0,0 +1,221 @@
+# // /catalog/search.py
+# // Full-text search over Book title, summary, author names and ISBN.
+# //   PostgreSQL: catalog_book.search_vector (tsvector) + GIN index
+# //   SQLite:     catalog_book_fts, an FTS5 shadow table (rowid = book id)
+# //   others:     icontains fallback (slow, only so the page works)
+# // Both structures are created by migration 0011 and kept up to date
+# // from catalog/signals.py; `manage.py rebuild_search_index` rebuilds them.
+
+import re
+
+from django.apps import apps as django_apps
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+
+from catalog.models import Book
+
+FTS_TABLE = 'catalog_book_fts'
+SEARCH_COLUMN = 'search_vector'
+SEARCH_INDEX = 'catalog_book_search_idx'
+
+# // title/authors/isbn weigh more than the summary
+PG_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'B')"
+)
+FTS_BM25 = f'bm25({FTS_TABLE}, 10.0, 1.0, 5.0, 10.0)'
+
+
+def _vendor(using):
+    return connections[using].vendor
+
+
+# //=====================================
+# // schema (called from the migration)
+# //=====================================
+def create_search_structures(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'ALTER TABLE catalog_book ADD COLUMN {SEARCH_COLUMN} tsvector')
+        schema_editor.execute(f'CREATE INDEX {SEARCH_INDEX} ON catalog_book USING GIN ({SEARCH_COLUMN})')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, summary, authors, isbn, tokenize = 'porter unicode61')"
+        )
+
+
+def drop_search_structures(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+        schema_editor.execute(f'ALTER TABLE catalog_book DROP COLUMN IF EXISTS {SEARCH_COLUMN}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+# //=====================================
+# // indexing
+# //=====================================
+# // apps: the historical models when called from a migration
+def _documents(book_ids, using, apps=django_apps):
+    # // (id, title, summary, isbn, "First Last, First Last") for each book
+    Book = apps.get_model('catalog', 'Book')
+    authors = {}
+    through = Book.author.through.objects.using(using).filter(book_id__in=book_ids)
+    for book_id, first_name, last_name in through.values_list(
+            'book_id', 'author__first_name', 'author__last_name').order_by('author__last_name', 'author__first_name'):
+        authors.setdefault(book_id, []).append(f'{first_name} {last_name}')
+    rows = Book.objects.using(using).filter(pk__in=book_ids).values_list('pk', 'title', 'summary', 'isbn')
+    return [(pk, title, summary, isbn, ', '.join(authors.get(pk, []))) for pk, title, summary, isbn in rows]
+
+
+def index_books(book_ids, using=DEFAULT_DB_ALIAS, apps=django_apps):
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    vendor = _vendor(using)
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+    documents = _documents(book_ids, using, apps)
+    with connections[using].cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.executemany(
+                f'UPDATE catalog_book SET {SEARCH_COLUMN} = {PG_DOCUMENT} WHERE id = %s',
+                [(authors, pk) for pk, title, summary, isbn, authors in documents],
+            )
+        else:
+            placeholders = ', '.join(['%s'] * len(book_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, summary, authors, isbn) VALUES (%s, %s, %s, %s, %s)',
+                [(pk, title, summary, authors, isbn) for pk, title, summary, isbn, authors in documents],
+            )
+
+
+def unindex_books(book_ids, using=DEFAULT_DB_ALIAS):
+    # // PostgreSQL keeps the vector on the row itself, nothing to do there
+    book_ids = list(book_ids)
+    if book_ids and _vendor(using) == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS, chunk_size=2000, apps=django_apps):
+    Book = apps.get_model('catalog', 'Book')
+    if _vendor(using) == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    book_ids = Book.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    total, chunk = 0, []
+    for pk in book_ids.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) == chunk_size:
+            index_books(chunk, using, apps)
+            total, chunk = total + len(chunk), []
+    index_books(chunk, using, apps)
+    return total + len(chunk)
+
+
+# //=====================================
+# // querying
+# //=====================================
+def _terms(query):
+    # // '978-0-14-044913-6' -> one ISBN term; punctuation never reaches the parser
+    query = re.sub(r'(?<=[0-9])[- ](?=[0-9Xx])', '', query)
+    return re.findall(r'\w+', query)
+
+
+def _fts_match(terms):
+    # // every term must match, the last one as a prefix (search-as-you-type)
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _pg_tsquery(terms):
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+class BookSearchResults:
+    # // lazy, sliceable result set that django.core.paginator.Paginator can page:
+    # // count() runs one COUNT, a slice runs one ranked LIMIT/OFFSET query
+    # // plus one query (and the author prefetch) for the Book rows of that page
+    def __init__(self, query, using=None):
+        self.query = query
+        self.terms = _terms(query)
+        self.using = using or router.db_for_read(Book)
+        self.vendor = _vendor(self.using)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            elif self.vendor == 'sqlite':
+                self._count = self._fetch(
+                    f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_match(self.terms)])[0][0]
+            elif self.vendor == 'postgresql':
+                self._count = self._fetch(
+                    f"SELECT count(*) FROM catalog_book WHERE {SEARCH_COLUMN} @@ to_tsquery('english', %s)",
+                    [_pg_tsquery(self.terms)])[0][0]
+            else:
+                self._count = self._fallback_queryset().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop - offset) if index.stop is not None else self.count() - offset
+        return self._page(offset, max(limit, 0))
+
+    def _fetch(self, sql, params):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _fallback_queryset(self):
+        queryset = Book.objects.using(self.using).order_by('title', 'pk')
+        for term in self.terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(summary__icontains=term) | Q(isbn__icontains=term)
+                | Q(author__first_name__icontains=term) | Q(author__last_name__icontains=term)
+            )
+        return queryset.distinct()
+
+    def _page(self, offset, limit):
+        if not self.terms or not limit:
+            return []
+        if self.vendor == 'sqlite':
+            ranked = self._fetch(
+                f'SELECT rowid, -{FTS_BM25} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY {FTS_BM25}, rowid LIMIT %s OFFSET %s',
+                [_fts_match(self.terms), limit, offset])
+        elif self.vendor == 'postgresql':
+            ranked = self._fetch(
+                f'SELECT id, ts_rank_cd({SEARCH_COLUMN}, query) AS score '
+                f"FROM catalog_book, to_tsquery('english', %s) query WHERE {SEARCH_COLUMN} @@ query "
+                f'ORDER BY score DESC, id LIMIT %s OFFSET %s',
+                [_pg_tsquery(self.terms), limit, offset])
+        else:
+            ranked = [(pk, None) for pk in self._fallback_queryset().values_list('pk', flat=True)[offset:offset + limit]]
+
+        books = Book.objects.using(self.using).select_related('language').prefetch_related('author').in_bulk(
+            [pk for pk, score in ranked])
+        results = []
+        for pk, score in ranked:
+            if pk in books:
+                books[pk].search_rank = score
+                results.append(books[pk])
+        return results
+
+
+def search_books(query):
+    return BookSearchResults(query)
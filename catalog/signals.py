@@ -0,0 +1,431 @@
+# // /catalog/signals.py
+# // Receivers that keep cached/derived catalog data in step with the models.
+# // Connected once from CatalogConfig.ready()
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from catalog import counters, search
+from catalog.cache import LIST, bump_generation, bump_generations, bump_model_generation
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+# //=====================================
+# // LibraryCounter maintenance
+# //=====================================
+
+# // remember the loaded values so post_save can tell what changed.
+# // Only values already loaded: reading a deferred field here would run
+# // refresh_from_db(), whose partial instance runs post_init again, and so on.
+NOT_LOADED = object()
+
+# // model -> {attname: attributes remembering its value}
+REMEMBERED = {
+    Book: {'language_id': ['_counted_language_id'], 'title': ['_listed_title']},
+    BookInstance: {'status': ['_counted_status'], 'book_id': ['_touched_book_id', '_generation_book_id']},
+    Author: {'last_name': ['_listed_last_name'], 'first_name': ['_listed_first_name']},
+}
+
+
+@receiver(post_init, sender=Book)
+@receiver(post_init, sender=BookInstance)
+@receiver(post_init, sender=Author)
+def remember_loaded_values(sender, instance, **kwargs):
+    for attname, attributes in REMEMBERED[sender].items():
+        value = instance.__dict__.get(attname, NOT_LOADED)
+        for attribute in attributes:
+            setattr(instance, attribute, value)
+
+
+# // values deferred at load time, read from the row before it changes:
+# // on save only those that were set since (a field still deferred is not
+# // saved), on delete all of them; one query, and only for partial instances
+def _recall_deferred_values(sender, instance, deleting):
+    missing = {
+        attname: attributes for attname, attributes in REMEMBERED[sender].items()
+        if getattr(instance, attributes[0], NOT_LOADED) is NOT_LOADED
+        and (deleting or attname in instance.__dict__)
+    }
+    if not missing or instance.pk is None:
+        return
+    row = sender._base_manager.filter(pk=instance.pk).values(*missing).first() or {}
+    for attname, attributes in missing.items():
+        for attribute in attributes:
+            setattr(instance, attribute, row.get(attname))
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_save, sender=Author)
+def recall_values_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _recall_deferred_values(sender, instance, deleting=False)
+
+
+@receiver(pre_delete, sender=Book)
+@receiver(pre_delete, sender=BookInstance)
+def recall_values_before_delete(sender, instance, **kwargs):
+    _recall_deferred_values(sender, instance, deleting=True)
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.increment(counters.BOOKS)
+    elif 'language_id' not in instance.__dict__ or instance._counted_language_id == instance.language_id:
+        return
+    elif instance._counted_language_id is not None:
+        counters.increment(counters.books_language_key(instance._counted_language_id), -1)
+    if instance.language_id is not None:
+        counters.increment(counters.books_language_key(instance.language_id))
+    instance._counted_language_id = instance.language_id
+
+
+# // the through rows are cascade-deleted without m2m_changed, so count them first
+@receiver(pre_delete, sender=Book)
+def uncount_book_relations(sender, instance, **kwargs):
+    for genre_id in Book.genre.through.objects.filter(book=instance).values_list('genre_id', flat=True):
+        counters.increment(counters.books_genre_key(genre_id), -1)
+    for author_id in Book.author.through.objects.filter(book=instance).values_list('author_id', flat=True):
+        counters.increment(counters.books_author_key(author_id), -1)
+
+
+@receiver(post_delete, sender=Book)
+def uncount_deleted_book(sender, instance, **kwargs):
+    counters.increment(counters.BOOKS, -1)
+    if instance._counted_language_id is not None:
+        counters.increment(counters.books_language_key(instance._counted_language_id), -1)
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_copy(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.increment(counters.COPIES)
+    elif 'status' not in instance.__dict__ or instance._counted_status == instance.status:
+        return
+    else:
+        counters.increment(counters.copies_status_key(instance._counted_status), -1)
+    counters.increment(counters.copies_status_key(instance.status))
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def uncount_deleted_copy(sender, instance, **kwargs):
+    counters.increment(counters.COPIES, -1)
+    counters.increment(counters.copies_status_key(instance._counted_status), -1)
+
+
+@receiver(post_save, sender=Author)
+def count_saved_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment(counters.AUTHORS)
+
+
+@receiver(post_delete, sender=Author)
+def uncount_deleted_author(sender, instance, **kwargs):
+    counters.increment(counters.AUTHORS, -1)
+    counters.discard(counters.books_author_key(instance.pk))
+
+
+@receiver(post_delete, sender=Genre)
+def discard_genre_counter(sender, instance, **kwargs):
+    counters.discard(counters.books_genre_key(instance.pk))
+
+
+@receiver(post_delete, sender=Language)
+def discard_language_counter(sender, instance, **kwargs):
+    counters.discard(counters.books_language_key(instance.pk))
+
+
+# // Book.genre / Book.author, from either side of the relation:
+# // forward -> instance is a Book, pk_set holds genre/author ids
+# // reverse -> instance is a Genre/Author, pk_set holds book ids
+def _count_book_m2m(through, target_field, key, instance, action, reverse, pk_set):
+    own_field = 'book_id' if not reverse else f'{target_field}_id'
+    other_field = f'{target_field}_id' if not reverse else 'book_id'
+    
+    if action in ('pre_remove', 'pre_clear'):
+        # // Django reports every requested pk on remove, linked or not,
+        # // and none on clear: look up what will really be deleted
+        rows = through.objects.filter(**{own_field: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{f'{other_field}__in': pk_set})
+        instance._counted_m2m_removed = list(rows.values_list(other_field, flat=True))
+        return
+    if action == 'post_add':
+        # // post_add only carries the pks that were actually missing
+        changed, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = instance.__dict__.pop('_counted_m2m_removed', []), -1
+    else:
+        return
+    
+    if not reverse:
+        for target_id in changed:
+            counters.increment(key(target_id), delta)
+    else:
+        counters.increment(key(instance.pk), delta * len(changed))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def count_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    _count_book_m2m(sender, 'genre', counters.books_genre_key, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+def count_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    _count_book_m2m(sender, 'author', counters.books_author_key, instance, action, reverse, pk_set)
+
+
+# //=====================================
+# // full-text search index (catalog/search.py)
+# //=====================================
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        search.index_books([instance.pk], using)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, using=None, **kwargs):
+    search.unindex_books([instance.pk], using)
+
+
+# // author names are part of every book document they appear in
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, created, raw=False, using=None, **kwargs):
+    if not created and not raw:
+        search.index_books(instance.book_set.values_list('pk', flat=True), using)
+
+
+# // the through rows are cascade-deleted without m2m_changed; also read by
+# // bump_book_generations_on_author_delete
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def reindex_former_author_books(sender, instance, using=None, **kwargs):
+    search.index_books(instance.__dict__.get('_search_book_ids', []), using)
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+def reindex_books_on_author_change(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance.pk], using)
+    elif action == 'pre_clear':
+        instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set, using)
+    elif action == 'post_clear':
+        search.index_books(instance.__dict__.pop('_search_book_ids', []), using)
+
+
+# //=====================================
+# // Book.updated_at (HTTP validators, catalog/api.py)
+# //=====================================
+def touch_books(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_books_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_books([instance.pk])
+    elif action == 'pre_clear':
+        instance._touched_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        touch_books(pk_set)
+    elif action == 'post_clear':
+        touch_books(instance.__dict__.pop('_touched_book_ids', []))
+
+
+# // genre/language names are part of the book representation
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def touch_books_on_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        touch_books(instance.book_set.values_list('pk', flat=True))
+
+
+# // a copy's status/due date is shown on its book's page
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_book_on_copy_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_id = instance.__dict__.get('book_id', instance._touched_book_id)
+    touch_books({book_id, instance._touched_book_id} - {None, NOT_LOADED})
+    instance._touched_book_id = book_id
+
+
+# //=====================================
+# // generations of cached fragments (catalog/cache.py)
+# //=====================================
+# // book fragments: its authors list, its copies list, its block on author pages
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def bump_book_generation(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_generation(Book, instance.pk)
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bump_book_generation_on_copy_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        book_id = instance.__dict__.get('book_id', instance._generation_book_id)
+        bump_generations(Book, {book_id, instance._generation_book_id} - {None, NOT_LOADED})
+        instance._generation_book_id = book_id
+
+
+@receiver(post_save, sender=Author)
+def bump_book_generations_on_author_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_generations(Book, instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def bump_book_generations_on_author_delete(sender, instance, **kwargs):
+    bump_generations(Book, instance.__dict__.get('_search_book_ids', []))
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+@receiver(m2m_changed, sender=Book.genre.through)
+def bump_book_generations_on_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_generation(Book, instance.pk)
+    elif action == 'pre_clear':
+        instance._generation_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        bump_generations(Book, pk_set)
+    elif action == 'post_clear':
+        bump_generations(Book, instance.__dict__.pop('_generation_book_ids', []))
+
+
+# // genre/language names are shown on the book page
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def bump_book_generations_on_rename(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_generations(Book, instance.book_set.values_list('pk', flat=True))
+
+
+# //=====================================
+# // anonymous page cache (catalog/page_cache.py): author pages and list pages
+# //=====================================
+# // list pages are ordered by these, so adding, removing or renaming moves rows
+LISTED = {Book: {'title': '_listed_title'}, Author: {'last_name': '_listed_last_name', 'first_name': '_listed_first_name'}}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def bump_list_generation_on_save(sender, instance, created, raw=False, **kwargs):
+    # // a field still deferred was not saved, so did not change
+    changed = [
+        attname for attname, attribute in LISTED[sender].items()
+        if attname in instance.__dict__ and getattr(instance, attribute) != instance.__dict__[attname]
+    ]
+    if created or raw or changed:
+        bump_generation(sender, LIST)
+    for attname, attribute in LISTED[sender].items():
+        setattr(instance, attribute, instance.__dict__.get(attname, NOT_LOADED))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def bump_list_generation_on_delete(sender, instance, **kwargs):
+    bump_generation(sender, LIST)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def bump_author_generation(sender, instance, **kwargs):
+    bump_generation(Author, instance.pk)
+
+
+# // the author page lists the author's books
+@receiver(m2m_changed, sender=Book.author.through)
+def bump_author_generations_on_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_generation(Author, instance.pk)
+    elif action == 'pre_clear':
+        instance._generation_author_ids = list(instance.author.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        bump_generations(Author, pk_set)
+    elif action == 'post_clear':
+        bump_generations(Author, instance.__dict__.pop('_generation_author_ids', []))
+
+
+# //=====================================
+# // model generations (catalog/cache.py): cached counts, stats and querysets
+# //=====================================
+CACHED_MODELS = (Author, Book, BookInstance, Genre, Language)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_generation_on_change(sender, **kwargs):
+    if sender in CACHED_MODELS:
+        bump_model_generation(sender)
+
+
+# // a link change alters the book and the genre/author side of it
+@receiver(m2m_changed, sender=Book.genre.through)
+@receiver(m2m_changed, sender=Book.author.through)
+def bump_model_generations_on_links(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_model_generation(Book)
+        bump_model_generation(Genre if sender is Book.genre.through else Author)
+
+
+# //=====================================
+# // cached permission sets (catalog/auth_backends.py)
+# //=====================================
+# // a user's own permissions or groups
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_user_generation_on_permission_change(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_generation(User, instance.pk)
+    else:
+        # // from the permission/group side: every member may be affected
+        bump_model_generation(Group if sender is User.groups.through else Permission)
+
+
+# // is_superuser / is_active decide the whole set; logins (last_login only) do not
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_generation(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_generation(User, instance.pk)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def bump_group_generation_on_permission_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_model_generation(Group)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def bump_permission_generations(sender, **kwargs):
+    bump_model_generation(sender)
@@ -0,0 +1,35 @@
+# // /catalog/stats.py
+# // Home page statistics: read from the denormalized LibraryCounter rows
+# // (catalog/counters.py), then cached until a catalog row changes
+# // (model generations, see catalog/cache.py and catalog/signals.py).
+
+from catalog import counters
+from catalog.cache import bump_model_generation, cached
+from catalog.models import Author, Book, BookInstance, Genre, LibraryCounter
+
+
+def compute_library_stats():
+    # // two small queries, whatever the size of the catalog
+    values = counters.read_counters()
+    genre_histogram = [
+        (name, values.get(counters.books_genre_key(genre_id), 0))
+        for genre_id, name in Genre.objects.order_by('name').values_list('pk', 'name')
+    ]
+    return {
+        'num_authors': values.get(counters.AUTHORS, 0),
+        'num_books': values.get(counters.BOOKS, 0),
+        'num_instances': values.get(counters.COPIES, 0),
+        'num_inst_available': values.get(counters.copies_status_key('a'), 0),
+        'num_genre': len(genre_histogram),
+        'genre_histogram': genre_histogram,
+    }
+
+
+@cached('library-stats', models=(Author, Book, BookInstance, Genre, LibraryCounter))
+def get_library_stats():
+    return compute_library_stats()
+
+
+# // for writes that bypass the signals (bulk updates, counter rebuilds)
+def invalidate_library_stats():
+    bump_model_generation(LibraryCounter)
@@ -0,0 +1,113 @@
+# // /catalog/tests/test_admin.py
+# // query counts of the admin changelists, the capped copies inline
+# // and the bulk circulation actions
+import datetime
+
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import counters
+from catalog.admin import CappedInlineFormSet
+from catalog.cache import get_generation
+from catalog.models import Author, Book, BookInstance, CirculationLog, Genre
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def add_books(self, number):
+        for number in range(number):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number:09}')
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=self.admin)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_independent_of_rows(self):
+        for url in (reverse('admin:catalog_book_changelist'), reverse('admin:catalog_bookinstance_changelist')):
+            with self.subTest(url=url):
+                BookInstance.objects.all().delete()
+                Book.objects.all().delete()
+                self.add_books(2)
+                few = self.count_queries(url)
+                self.add_books(10)
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_copies_inline_is_capped(self):
+        self.add_books(1)
+        book = Book.objects.get()
+        BookInstance.objects.bulk_create([
+            BookInstance(book=book, imprint='Imprint', status='a')
+            for number in range(CappedInlineFormSet.max_rows + 5)
+        ])
+        response = self.client.get(reverse('admin:catalog_book_change', args=[book.pk]))
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(formset.initial_form_count(), CappedInlineFormSet.max_rows)
+
+
+class CirculationActionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.due = datetime.date.today() + datetime.timedelta(days=3)
+        self.loans = [
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', due_back=self.due, borrower=self.admin)
+            for number in range(3)
+        ]
+        self.shelved = BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+
+    def run_action(self, action, copies, **extra):
+        data = {'action': action, helpers.ACTION_CHECKBOX_NAME: [str(copy.pk) for copy in copies], **extra}
+        return self.client.post(reverse('admin:catalog_bookinstance_changelist'), data, follow=True)
+
+    def test_mark_returned_is_one_update(self):
+        generation = get_generation(Book, self.book.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.run_action('mark_returned', self.loans + [self.shelved])
+        self.assertContains(response, '3 copies marked returned.')
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "catalog_bookinstance"') for query in queries), 1)
+        self.assertEqual(BookInstance.objects.filter(status='a', borrower=None, due_back=None).count(), 3)
+        self.assertEqual(BookInstance.objects.get(pk=self.shelved.pk).status, 'm')
+        self.assertEqual(CirculationLog.objects.filter(action='returned', old_status='o', new_status='a').count(), 3)
+        self.assertNotEqual(get_generation(Book, self.book.pk), generation)
+
+    def test_status_counters_follow_bulk_update(self):
+        self.run_action('send_to_maintenance', self.loans[:2])
+        self.assertEqual(counters.counter_drift(), {})
+        values = counters.read_counters()
+        self.assertEqual(values[counters.copies_status_key('m')], 3)
+        self.assertEqual(values[counters.copies_status_key('o')], 1)
+
+    def test_extend_due_back_asks_for_weeks(self):
+        response = self.run_action('extend_due_back', self.loans[:2])
+        self.assertTemplateUsed(response, 'admin/catalog/bookinstance/extend_due_back.html')
+        self.assertFalse(CirculationLog.objects.exists())
+        response = self.run_action('extend_due_back', self.loans[:2] + [self.shelved], apply='1', weeks='2')
+        self.assertContains(response, '2 copies extended by 2 weeks.')
+        extended = self.due + datetime.timedelta(weeks=2)
+        self.assertEqual(BookInstance.objects.filter(due_back=extended).count(), 2)
+        self.assertEqual(BookInstance.objects.get(pk=self.loans[2].pk).due_back, self.due)
+        self.assertEqual(set(CirculationLog.objects.values_list('new_due_back', flat=True)), {extended})
+
+    def test_extend_due_back_rejects_long_extensions(self):
+        response = self.run_action('extend_due_back', self.loans, apply='1', weeks='5')
+        self.assertTemplateUsed(response, 'admin/catalog/bookinstance/extend_due_back.html')
+        self.assertEqual(BookInstance.objects.filter(due_back=self.due).count(), 3)
@@ -0,0 +1,81 @@
+# // /catalog/tests/ test_api.py
+# // python manage.py test catalog.tests.test_api
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.books = []
+        for number in range(25):
+            book = Book.objects.create(title=f'Book {number:02}', summary='Summary', isbn=f'ISBN{number}')
+            book.author.set([self.author])
+            book.genre.set([self.genre])
+            self.books.append(book)
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def test_book_list_pages(self):
+        data = self.get(reverse('api-v1-books-url')).json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(data['num_pages'], 2)
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['title'], 'Book 00')
+        self.assertEqual(data['results'][0]['authors'], [{'id': self.author.pk, 'name': 'John Tolkien'}])
+        data = self.get(reverse('api-v1-books-url') + '?page=2&page_size=20').json()
+        self.assertEqual((len(data['results']), data['next'], data['previous']), (5, None, 1))
+        self.assertEqual(self.get(reverse('api-v1-books-url') + '?page=9').status_code, 404)
+
+    def test_book_detail(self):
+        data = self.get(reverse('api-v1-book-detail-url', args=[self.books[0].pk])).json()
+        self.assertEqual(data['genres'], ['Fantasy'])
+        self.assertEqual(data['summary'], 'Summary')
+        self.assertEqual(self.get(reverse('api-v1-book-detail-url', args=[999])).status_code, 404)
+
+    def test_author_detail_lists_books(self):
+        data = self.get(reverse('api-v1-author-detail-url', args=[self.author.pk])).json()
+        self.assertEqual(len(data['books']), 25)
+        self.assertEqual(data['last_name'], 'Tolkien')
+
+    def test_not_modified_skips_serialization(self):
+        url = reverse('api-v1-book-detail-url', args=[self.books[0].pk])
+        response = self.get(url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_list_not_modified_runs_one_query(self):
+        url = reverse('api-v1-authors-url')
+        etag = self.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_etag_changes_when_representation_changes(self):
+        detail = reverse('api-v1-book-detail-url', args=[self.books[0].pk])
+        listing = reverse('api-v1-books-url')
+        detail_etag, list_etag = self.get(detail)['ETag'], self.get(listing)['ETag']
+        # // author rename shows up in both without touching the books
+        self.author.first_name = 'J. R. R.'
+        self.author.save()
+        self.assertEqual(self.get(detail, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        self.assertEqual(self.get(listing, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        # // genre removal touches the book
+        detail_etag = self.get(detail)['ETag']
+        self.books[0].genre.clear()
+        response = self.get(detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['genres'], [])
+
+    def test_only_get(self):
+        self.assertEqual(self.client.post(reverse('api-v1-books-url')).status_code, 405)
@@ -0,0 +1,490 @@
+# // /catalog/tests/ test_cache.py
+# // python manage.py test catalog.tests.test_cache
+
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.cache import LIST, cache_metrics, cached, cached_queryset, get_generations, get_model_generations
+from catalog.cache_backends import FileCache, RedisCache
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.stats import get_library_stats
+
+
+# //=====================================
+# // a Redis-protocol stand-in: the commands RedisCache sends, in memory
+# //=====================================
+class FakeRespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            with self.server.lock:
+                self.server.commands.append(args[0].decode().upper())
+                reply = self.execute(args[0].decode().upper(), args[1:])
+            self.wfile.write(reply)
+
+    def lookup(self, key):
+        value, expires = self.server.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.server.data.pop(key, None)
+            return None
+        return value
+
+    @staticmethod
+    def bulk(value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def execute(self, command, args):
+        data = self.server.data
+        if command == 'GET':
+            return self.bulk(self.lookup(args[0]))
+        if command == 'SET':
+            key, value, options = args[0], args[1], [arg.decode().upper() for arg in args[2:]]
+            if 'NX' in options and self.lookup(key) is not None:
+                return b'$-1\r\n'
+            expires = time.monotonic() + int(options[options.index('PX') + 1]) / 1000 if 'PX' in options else None
+            data[key] = (value, expires)
+            return b'+OK\r\n'
+        if command == 'MGET':
+            return b'*%d\r\n' % len(args) + b''.join(self.bulk(self.lookup(key)) for key in args)
+        if command == 'EXISTS':
+            return b':%d\r\n' % sum(self.lookup(key) is not None for key in args)
+        if command == 'DEL':
+            return b':%d\r\n' % sum(data.pop(key, None) is not None for key in args)
+        if command == 'INCRBY':
+            try:
+                value = int(self.lookup(args[0]) or 0) + int(args[1])
+            except ValueError:
+                return b'-ERR value is not an integer or out of range\r\n'
+            data[args[0]] = (str(value).encode(), data.get(args[0], (None, None))[1])
+            return b':%d\r\n' % value
+        if command == 'EVAL' and args[0].decode() == RedisCache.INCR_SCRIPT:
+            if self.lookup(args[2]) is None:
+                return b'$-1\r\n'
+            return self.execute('INCRBY', args[2:])
+        if command == 'FLUSHDB':
+            data.clear()
+            return b'+OK\r\n'
+        return b'-ERR unknown command\r\n'
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRespHandler)
+        self.data = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+    @property
+    def location(self):
+        return 'redis://%s:%d/0' % self.server_address
+
+
+def start_fake_server(test_case):
+    server = FakeRespServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server
+
+
+class RedisCacheBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.server = start_fake_server(self)
+        self.cache = RedisCache(self.server.location, {})
+        self.addCleanup(self.cache.disconnect)
+
+    def test_set_get_delete(self):
+        self.cache.set('book', {'title': 'Dune'})
+        self.assertEqual(self.cache.get('book'), {'title': 'Dune'})
+        self.assertTrue(self.cache.delete('book'))
+        self.assertIsNone(self.cache.get('book'))
+        self.assertEqual(self.cache.get('book', 'missing'), 'missing')
+
+    def test_add_only_sets_missing_keys(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+
+    def test_integers_are_stored_raw_and_incremented_by_the_server(self):
+        self.cache.set('counter', 5)
+        self.assertEqual(self.cache.incr('counter', 2), 7)
+        self.assertEqual(self.cache.decr('counter'), 6)
+        self.assertEqual(self.cache.get('counter'), 6)
+        self.assertIn(b'6', [value for value, expires in self.server.data.values()])
+
+    def test_incr_of_missing_key_raises(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_one_command(self):
+        self.cache.set('counter', 1)
+        del self.server.commands[:]
+        self.cache.incr('counter')
+        self.assertEqual(self.server.commands, ['EVAL'])
+
+    def test_get_many_and_delete_many(self):
+        self.cache.set_many({'a': 1, 'b': 'two'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'two'})
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_timeout(self):
+        self.cache.set('short', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_reconnects_after_the_connection_drops(self):
+        self.cache.set('key', 'value')
+        self.cache._client._sock.close()
+        self.cache._client._file.close()
+        self.cache._client._sock = self.cache._client._file = None
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_clear(self):
+        self.cache.set('key', 'value')
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('key'))
+
+
+class FileCacheBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = FileCache(directory, {})
+
+    def test_concurrent_incr_loses_no_bump(self):
+        self.cache.set('generation', 0, None)
+        workers = [
+            threading.Thread(target=lambda: [self.cache.incr('generation') for _ in range(25)]) for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('generation'), 100)
+
+
+# //=====================================
+# // cached values, model generations and metrics (catalog/cache.py)
+# //=====================================
+calls = []
+
+
+@cached('test-book-titles', models=[Book])
+def book_titles(prefix=''):
+    calls.append(prefix)
+    return sorted(Book.objects.filter(title__startswith=prefix).values_list('title', flat=True))
+
+
+class CachedValueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+        self.book = Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+
+    def test_second_call_is_a_hit(self):
+        self.assertEqual(book_titles(), ['Dune'])
+        with self.assertNumQueries(0):
+            self.assertEqual(book_titles(), ['Dune'])
+        self.assertEqual(calls, [''])
+        self.assertEqual(cache_metrics()['test-book-titles'], {'hits': 1, 'misses': 1})
+
+    def test_arguments_are_part_of_the_key(self):
+        book_titles('D')
+        self.assertEqual(book_titles('X'), [])
+        self.assertEqual(calls, ['D', 'X'])
+
+    def test_model_change_invalidates(self):
+        book_titles()
+        Book.objects.create(title='Emma', summary='Summary', isbn='ISBN2')
+        self.assertEqual(book_titles(), ['Dune', 'Emma'])
+        self.book.delete()
+        self.assertEqual(book_titles(), ['Emma'])
+
+    def test_unrelated_model_change_keeps_the_value(self):
+        book_titles()
+        Language.objects.create(name='English')
+        book_titles()
+        self.assertEqual(calls, [''])
+
+    def test_every_catalog_model_bumps_its_generation(self):
+        language = Language.objects.create(name='English')
+        genre = Genre.objects.create(name='Fantasy')
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        models = (Author, Book, BookInstance, Genre, Language)
+        before = get_model_generations(models)
+        author.save()
+        self.book.save()
+        BookInstance.objects.create(book=self.book, imprint='Imprint')
+        genre.save()
+        language.save()
+        after = get_model_generations(models)
+        self.assertTrue(all(new > old for old, new in zip(before, after)))
+
+    def test_m2m_change_bumps_book_and_related_model(self):
+        genre = Genre.objects.create(name='Fantasy')
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        before = get_model_generations((Book, Genre, Author))
+        self.book.genre.add(genre)
+        self.book.author.add(author)
+        after = get_model_generations((Book, Genre, Author))
+        self.assertTrue(all(new > old for old, new in zip(before, after)))
+
+    def test_cached_queryset(self):
+        queryset = Book.objects.order_by('title')
+        self.assertEqual(cached_queryset(queryset, 'test-books'), [self.book])
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_queryset(Book.objects.order_by('title'), 'test-books'), [self.book])
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+        self.assertEqual(cached_queryset(queryset, 'test-books')[0].title, 'Dune Messiah')
+
+    def test_cache_stats_command(self):
+        book_titles()
+        book_titles()
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('test-book-titles: 1 hits, 1 misses (50% hit rate)', out.getvalue())
+        self.assertEqual(cache_metrics()['test-book-titles'], {'hits': 0, 'misses': 0})
+
+
+class GenerationCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    # // a value cached by another request before the commit, from the old
+    # // rows, must not be served afterwards
+    def test_generation_is_bumped_again_on_commit(self):
+        with transaction.atomic():
+            Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+            during = get_model_generations([Book])
+        self.assertGreater(get_model_generations([Book]), during)
+
+
+class RedisBackedCatalogCacheTest(TestCase):
+    def setUp(self):
+        server = start_fake_server(self)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'catalog.cache_backends.RedisCache', 'LOCATION': server.location,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(lambda: cache.disconnect())
+
+    def test_library_stats_through_the_redis_backend(self):
+        Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+        self.assertEqual(get_library_stats()['num_books'], 1)
+        with self.assertNumQueries(0):
+            get_library_stats()
+        Book.objects.create(title='Emma', summary='Summary', isbn='ISBN2')
+        self.assertEqual(get_library_stats()['num_books'], 2)
+
+
+# //=====================================
+# // anonymous page cache (catalog/page_cache.py)
+# //=====================================
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        self.book = Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+        self.book.author.set([self.author])
+        self.other = Book.objects.create(title='Emma', summary='Summary', isbn='ISBN2')
+        self.urls = {
+            'detail': reverse('book-detail-url', args=[self.book.pk]),
+            'other': reverse('book-detail-url', args=[self.other.pk]),
+            'list': reverse('books-url'),
+            'author': reverse('author-detail-url', args=[self.author.pk]),
+            'authors': reverse('authors-url'),
+        }
+
+    def warm(self):
+        for url in self.urls.values():
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def assertCached(self, name, expected=True):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.urls[name])
+        self.assertEqual(len(queries) == 0, expected, f'{name}: {len(queries)} queries')
+
+    def test_hits_run_no_query(self):
+        first = self.client.get(self.urls['detail']).content
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.urls['detail']).content, first)
+        self.assertEqual(cache_metrics()['page'], {'hits': 1, 'misses': 1})
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(self.urls['list'])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.urls['list'] + '?page=1')
+        self.assertTrue(queries)
+
+    def test_book_save_purges_its_pages_only(self):
+        self.warm()
+        self.book.summary = 'Changed'
+        self.book.save()
+        self.assertCached('detail', False)
+        self.assertCached('list', False)
+        self.assertCached('author', False)
+        self.assertCached('other')
+        self.assertCached('authors')
+        self.assertIn(b'Changed', self.client.get(self.urls['detail']).content)
+
+    def test_new_book_purges_the_list(self):
+        self.warm()
+        Book.objects.create(title='Anna', summary='Summary', isbn='ISBN3')
+        self.assertCached('list', False)
+        self.assertCached('detail')
+
+    # // post_init must not load deferred fields (it used to recurse until it crashed)
+    def test_renames_through_partially_loaded_instances(self):
+        generations = get_generations(Book, [LIST])
+        book = Book.objects.only('summary').get(pk=self.book.pk)
+        book.summary = 'Changed'
+        book.save()
+        self.assertEqual(get_generations(Book, [LIST]), generations)
+        book.refresh_from_db(fields=['title'])
+        book.title = 'Dune Messiah'
+        book.save()
+        self.assertNotEqual(get_generations(Book, [LIST]), generations)
+
+        generations = get_generations(Author, [LIST])
+        author = Author.objects.only('first_name').get(pk=self.author.pk)
+        author.save()
+        self.assertEqual(get_generations(Author, [LIST]), generations)
+        author.last_name = 'Herbert Jr.'
+        author.save()
+        self.assertNotEqual(get_generations(Author, [LIST]), generations)
+
+    def test_copy_change_purges_book_and_author_pages(self):
+        self.warm()
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.assertCached('detail', False)
+        self.assertCached('author', False)
+        self.assertCached('other')
+
+    def test_new_author_link_purges_the_author_page(self):
+        self.warm()
+        self.other.author.add(self.author)
+        self.assertCached('author', False)
+        self.assertIn(b'Emma', self.client.get(self.urls['author']).content)
+
+    def test_conditional_get_on_a_hit(self):
+        etag = self.client.get(self.urls['detail'])['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.urls['detail'], HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.warm()
+        self.client.force_login(User.objects.create_user(username='patron', password='1X<ISRUkw+tuK'))
+        response = self.client.get(self.urls['detail'])
+        self.assertContains(response, 'Place a hold')
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.urls['detail']), 'Place a hold')
+
+
+# //=====================================
+# // permission sets cached across requests (catalog/auth_backends.py)
+# //=====================================
+class PermissionCacheTest(TestCase):
+    def setUp(self):
+        # // permission sets are only cached in a cache shared by all processes
+        server = start_fake_server(self)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'catalog.cache_backends.RedisCache', 'LOCATION': server.location,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(lambda: cache.disconnect())
+        self.permission = Permission.objects.get(codename='can_mark_returned')
+        self.other_permission = Permission.objects.get(codename='add_book')
+        self.group = Group.objects.create(name='Librarians')
+        self.group.permissions.add(self.permission)
+        self.user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+
+    def permissions(self):
+        # // a fresh User object, as on a new request
+        return User.objects.get(pk=self.user.pk).get_all_permissions()
+
+    def test_second_request_skips_the_permission_queries(self):
+        self.user.groups.add(self.group)
+        self.assertEqual(self.permissions(), {'catalog.can_mark_returned'})
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('catalog.can_mark_returned'))
+
+    def test_per_process_cache_is_not_used(self):
+        self.user.groups.add(self.group)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.permissions()
+            user = User.objects.get(pk=self.user.pk)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(user.has_perm('catalog.can_mark_returned'))
+            self.assertTrue(queries)
+
+    def test_user_permission_change_invalidates(self):
+        self.assertEqual(self.permissions(), set())
+        self.user.user_permissions.add(self.other_permission)
+        self.assertEqual(self.permissions(), {'catalog.add_book'})
+        self.user.user_permissions.clear()
+        self.assertEqual(self.permissions(), set())
+
+    def test_group_membership_change_invalidates(self):
+        self.assertEqual(self.permissions(), set())
+        self.user.groups.add(self.group)
+        self.assertEqual(self.permissions(), {'catalog.can_mark_returned'})
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.permissions(), set())
+
+    def test_group_permission_change_invalidates(self):
+        self.user.groups.add(self.group)
+        self.permissions()
+        self.group.permissions.add(self.other_permission)
+        self.assertEqual(self.permissions(), {'catalog.can_mark_returned', 'catalog.add_book'})
+        self.other_permission.group_set.clear()
+        self.assertEqual(self.permissions(), {'catalog.can_mark_returned'})
+        self.group.delete()
+        self.assertEqual(self.permissions(), set())
+
+    def test_superuser_demotion_invalidates(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertIn('catalog.add_book', self.permissions())
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertEqual(self.permissions(), set())
+
+    def test_staff_page_after_permission_is_granted(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('all-loan-url')).status_code, 403)
+        self.user.groups.add(self.group)
+        self.assertEqual(self.client.get(reverse('all-loan-url')).status_code, 200)
@@ -0,0 +1,212 @@
+# // /catalog/tests/test_circulation.py
+# // checkout / return / renew / holds (catalog/circulation.py) and their endpoints
+import datetime
+import json
+import threading
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import circulation, counters
+from catalog.models import Book, BookInstance, CirculationLog, Hold
+
+
+class CirculationServiceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.copies = [BookInstance.objects.create(book=self.book, imprint='Imprint', status='a') for number in range(2)]
+
+    def test_checkout_any_copy(self):
+        copy = circulation.checkout(self.borrower, book_id=self.book.pk)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower), ('o', self.borrower))
+        self.assertEqual(copy.due_back, datetime.date.today() + circulation.LOAN_PERIOD)
+        other = circulation.checkout(self.borrower, book_id=self.book.pk)
+        self.assertNotEqual(other.pk, copy.pk)
+        with self.assertRaisesMessage(circulation.CirculationError, 'No available copy'):
+            circulation.checkout(self.borrower, book_id=self.book.pk)
+        self.assertEqual(counters.counter_drift(), {})
+
+    def test_checkout_writes_only_changed_columns(self):
+        copy_id = self.copies[0].pk
+        with CaptureQueriesContext(connection) as queries:
+            circulation.checkout(self.borrower, copy_id=copy_id)
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE "catalog_bookinstance"'))
+        self.assertNotIn('"imprint"', update)
+        self.assertNotIn('"book_id"', update.split('WHERE')[0])
+
+    def test_copy_must_be_available(self):
+        circulation.checkout(self.borrower, copy_id=self.copies[0].pk)
+        with self.assertRaisesMessage(circulation.CirculationError, 'not available'):
+            circulation.checkout(self.borrower, copy_id=self.copies[0].pk)
+
+    def test_return_and_renew(self):
+        copy = circulation.checkout(self.borrower, copy_id=self.copies[0].pk)
+        due = datetime.date.today() + datetime.timedelta(weeks=4)
+        self.assertEqual(circulation.renew(copy.pk, due).due_back, due)
+        copy = circulation.return_copy(copy.pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        with self.assertRaisesMessage(circulation.CirculationError, 'not on loan'):
+            circulation.return_copy(copy.pk)
+        self.assertEqual(
+            list(CirculationLog.objects.order_by('created_at', 'pk').values_list('action', flat=True)),
+            ['checked_out', 'renewed', 'returned'])
+
+
+class CirculationEndpointTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.force_login(librarian)
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def post_json(self, data):
+        return self.client.post(reverse('api-circulation-url'), json.dumps(data), content_type='application/json')
+
+    def test_json_checkout_and_conflict(self):
+        response = self.post_json({'action': 'checkout', 'book': self.book.pk, 'borrower': 'testuser1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['copy'], str(self.copy.pk))
+        self.assertEqual(response.json()['borrower'], 'testuser1')
+        response = self.post_json({'action': 'checkout', 'book': self.book.pk, 'borrower': 'testuser1'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_json_validation(self):
+        response = self.post_json({'action': 'renew', 'copy': str(self.copy.pk),
+                                   'due_back': (datetime.date.today() + datetime.timedelta(weeks=5)).isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('due_back', response.json()['errors'])
+        self.assertEqual(self.post_json(['not', 'an', 'object']).status_code, 400)
+
+    def test_json_requires_permission(self):
+        self.client.force_login(self.borrower)
+        self.assertEqual(self.post_json({'action': 'return', 'copy': str(self.copy.pk)}).status_code, 403)
+
+    def test_desk_page(self):
+        response = self.client.post(reverse('circulation-desk-url'), {
+            'action': 'checkout', 'copy': str(self.copy.pk), 'borrower': 'testuser1'})
+        self.assertContains(response, 'lent to testuser1')
+        response = self.client.post(reverse('circulation-desk-url'), {'action': 'return', 'copy': str(self.copy.pk)})
+        self.assertContains(response, 'is available')
+
+
+# // needs real row locks (PostgreSQL): SQLite has no SELECT ... FOR UPDATE
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentCheckoutTest(TransactionTestCase):
+    def test_concurrent_checkouts_take_different_copies(self):
+        borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        for number in range(2):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        locked, release, taken = threading.Event(), threading.Event(), []
+
+        def hold_first_copy():
+            try:
+                with transaction.atomic():
+                    taken.append(circulation.checkout(borrower, book_id=book.pk).pk)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first_copy)
+        thread.start()
+        locked.wait(5)
+        taken.append(circulation.checkout(borrower, book_id=book.pk).pk)
+        release.set()
+        thread.join()
+        self.assertEqual(len(set(taken)), 2)
+
+
+class HoldQueueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patrons = [
+            User.objects.create_user(username=f'patron{number}', password='1X<ISRUkw+tuK') for number in range(3)
+        ]
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        circulation.checkout(self.reader, copy_id=self.copy.pk)
+
+    def test_return_goes_to_head_of_queue(self):
+        holds = [circulation.place_hold(self.book.pk, patron) for patron in self.patrons]
+        with CaptureQueriesContext(connection) as queries:
+            copy = circulation.return_copy(self.copy.pk)
+        self.assertEqual(sum('"catalog_hold"' in query['sql'] and query['sql'].startswith('SELECT') for query in queries), 1)
+        self.assertEqual((copy.status, copy.borrower_id), ('r', self.patrons[0].pk))
+        self.assertEqual(Hold.objects.get(pk=holds[0].pk).status, 'r')
+        self.assertEqual(counters.counter_drift(), {})
+        # // only the patron it is reserved for can take it
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.patrons[1], copy_id=copy.pk)
+        circulation.checkout(self.patrons[0], book_id=self.book.pk)
+        self.assertEqual(Hold.objects.get(pk=holds[0].pk).status, 'f')
+
+    def test_hold_on_available_copy_is_ready(self):
+        circulation.return_copy(self.copy.pk)
+        hold = circulation.place_hold(self.book.pk, self.patrons[0])
+        self.assertEqual((hold.status, hold.copy_id), ('r', self.copy.pk))
+        with self.assertRaisesMessage(circulation.CirculationError, 'already hold'):
+            circulation.place_hold(self.book.pk, self.patrons[0])
+
+    def test_expired_pickup_passes_copy_on(self):
+        for patron in self.patrons[:2]:
+            circulation.place_hold(self.book.pk, patron)
+        circulation.return_copy(self.copy.pk)
+        later = timezone.now() + datetime.timedelta(days=30)
+        self.assertEqual(circulation.expire_holds(batch_size=1, now=later), 1)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.patrons[1])
+        self.assertEqual(circulation.expire_holds(now=later + datetime.timedelta(days=30)), 1)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, 'a')
+        self.assertEqual(list(Hold.objects.values_list('status', flat=True)), ['x', 'x'])
+
+    def test_bulk_return_goes_to_head_of_queue(self):
+        hold = circulation.place_hold(self.book.pk, self.patrons[0])
+        self.assertEqual(circulation.mark_returned(BookInstance.objects.filter(pk=self.copy.pk)), 1)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower_id), ('r', self.patrons[0].pk))
+        self.assertEqual(Hold.objects.get(pk=hold.pk).copy_id, copy.pk)
+        self.assertEqual(CirculationLog.objects.filter(action='returned').get().new_status, 'r')
+        self.assertEqual(counters.counter_drift(), {})
+
+    def test_bulk_actions_requeue_reserved_copy_hold(self):
+        holds = [circulation.place_hold(self.book.pk, patron) for patron in self.patrons[:2]]
+        circulation.return_copy(self.copy.pk)
+        circulation.send_to_maintenance(BookInstance.objects.filter(pk=self.copy.pk))
+        self.assertEqual(
+            list(Hold.objects.values_list('status', 'copy_id', 'expires_at')), [('w', None, None), ('w', None, None)])
+        # // back on the shelf: the first patron is still first in line
+        circulation.mark_available(BookInstance.objects.filter(pk=self.copy.pk))
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower_id), ('r', self.patrons[0].pk))
+        self.assertEqual(Hold.objects.get(pk=holds[0].pk).status, 'r')
+        self.assertEqual(counters.counter_drift(), {})
+
+    def test_queue_position_on_my_books(self):
+        for patron in self.patrons:
+            circulation.place_hold(self.book.pk, patron)
+        self.client.force_login(self.patrons[2])
+        response = self.client.get(reverse('my-loan-url'))
+        self.assertEqual([hold.position for hold in response.context['holds']], [3])
+        self.assertContains(response, 'number 3 in line')
+        circulation.return_copy(self.copy.pk)
+        response = self.client.get(reverse('my-loan-url'))
+        self.assertEqual([hold.position for hold in response.context['holds']], [2])
+
+    def test_place_and_cancel_from_pages(self):
+        self.client.force_login(self.patrons[0])
+        self.client.post(reverse('place-hold-url', args=[self.book.pk]))
+        hold = Hold.objects.get(patron=self.patrons[0])
+        self.client.post(reverse('cancel-hold-url', args=[hold.pk]))
+        self.assertEqual(Hold.objects.get(pk=hold.pk).status, 'c')
@@ -0,0 +1,151 @@
+# // /catalog/tests/ test_commands.py
+# // python manage.py test catalog.tests.test_commands
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.cache import get_object_generations
+from catalog.counters import counter_drift
+from catalog.importer import write_checkpoint
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.search import search_books
+
+CSV_FEED = '''isbn,title,summary,language,genres,authors,copy_id,imprint,status,due_back
+0-306-40615-2,The Hobbit,There and back again,English,Fantasy|Classic,"Tolkien, John",11111111-1111-1111-1111-111111111111,Allen 1937,a,
+9780306406157,The Hobbit,Duplicate row for a second copy,English,Fantasy,"Tolkien, John",22222222-2222-2222-2222-222222222222,Allen 1951,o,2020-06-01
+9780261103344,Narnia,Through the wardrobe,English,Fantasy,"Lewis, C. S.|Tolkien, John",,Bles 1950,m,
+not-an-isbn,Broken,Skipped,English,,,,Imprint,a,
+9780007119318,Orient Express,A train,French,Mystery,Agatha Christie,,,,
+'''
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as feed:
+            feed.write(content)
+        return path
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_catalog', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_csv_import(self):
+        Genre.objects.create(name='Fantasy')
+        output = self.run_import(self.write('feed.csv', CSV_FEED), '--batch-size', '2')
+        self.assertIn('1 skipped', output)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookInstance.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 2)
+        self.assertEqual(Author.objects.count(), 3)
+        hobbit = Book.objects.get(isbn13='9780306406157')
+        self.assertEqual(sorted(hobbit.genre.values_list('name', flat=True)), ['Classic', 'Fantasy'])
+        self.assertEqual(hobbit.bookinstance_set.count(), 2)
+        narnia = Book.objects.get(title='Narnia')
+        self.assertEqual(sorted(narnia.author.values_list('last_name', flat=True)), ['Lewis', 'Tolkien'])
+        self.assertEqual(Author.objects.get(last_name='Christie').first_name, 'Agatha')
+        # // derived data is brought up to date despite bulk_create
+        self.assertEqual(counter_drift(), {})
+        self.assertEqual([book.title for book in search_books('wardrobe')[:10]], ['Narnia'])
+
+    def test_rerun_does_not_duplicate(self):
+        path = self.write('feed.csv', CSV_FEED)
+        self.run_import(path)
+        output = self.run_import(path)
+        # // only what was really inserted is reported and counted
+        self.assertIn('Imported 0 books and 1 copies', output)
+        self.assertEqual(counter_drift(), {})
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 3)
+        # // only the two copies with a copy_id are idempotent
+        self.assertEqual(BookInstance.objects.count(), 4)
+        self.assertEqual(Book.author.through.objects.count(), 4)
+
+    def test_existing_books_are_touched(self):
+        self.run_import(self.write('feed.csv', CSV_FEED))
+        narnia = Book.objects.get(title='Narnia')
+        author = Author.objects.get(last_name='Lewis')
+        generations = get_object_generations([(Book, narnia.pk), (Author, author.pk)])
+        Book.objects.filter(pk=narnia.pk).update(updated_at=narnia.updated_at - datetime.timedelta(days=1))
+        record = {'isbn': '9780261103344', 'title': 'Narnia', 'genres': ['Classic'], 'authors': ['Lewis, C. S.']}
+        self.run_import(self.write('feed.jsonl', json.dumps(record) + '\n'))
+        self.assertGreater(Book.objects.get(pk=narnia.pk).updated_at, narnia.updated_at - datetime.timedelta(days=1))
+        changed = get_object_generations([(Book, narnia.pk), (Author, author.pk)])
+        self.assertNotEqual(changed[0], generations[0])
+        self.assertNotEqual(changed[1], generations[1])
+
+    def test_jsonl_import_with_lists(self):
+        record = {'isbn': '9780261103344', 'title': 'Narnia', 'genres': ['Fantasy'], 'authors': ['Lewis, C. S.']}
+        self.run_import(self.write('feed.jsonl', json.dumps(record) + '\n\n'))
+        book = Book.objects.get()
+        self.assertEqual(book.author.get().first_name, 'C. S.')
+        self.assertFalse(BookInstance.objects.exists())
+
+    def test_malformed_jsonl_line_is_skipped(self):
+        records = [
+            json.dumps({'isbn': '9780261103344', 'title': 'Narnia'}),
+            '{"isbn": "9780306406157", "title": ',
+            json.dumps({'isbn': '9780007119318', 'title': 'Orient Express'}),
+        ]
+        output = self.run_import(self.write('feed.jsonl', '\n'.join(records) + '\n'))
+        self.assertIn('1 skipped', output)
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Narnia', 'Orient Express'])
+        self.assertEqual(counter_drift(), {})
+
+    def test_resume_from_checkpoint(self):
+        path = self.write('feed.csv', CSV_FEED)
+        checkpoint = os.path.join(self.directory, 'feed.ckpt')
+        write_checkpoint(checkpoint, path, 3)
+        output = self.run_import(path, '--checkpoint', checkpoint)
+        self.assertIn('Resuming after record 3', output)
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Orient Express'])
+        with open(checkpoint) as saved:
+            self.assertEqual(json.load(saved)['records'], 5)
+        self.run_import(path, '--checkpoint', checkpoint, '--restart')
+        self.assertEqual(Book.objects.count(), 3)
+
+
+class ExportCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Tolkien')
+        genre = Genre.objects.create(name='Fantasy')
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary, with comma', isbn=f'ISBN{number}')
+            book.author.set([author])
+            book.genre.set([genre])
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def test_books_csv_query_count_does_not_grow_per_book(self):
+        out = StringIO()
+        # // one query for the chunk's books, one each for authors & genres
+        with self.assertNumQueries(3):
+            call_command('export_catalog', 'books', '--chunk-size', '10', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id,isbn,isbn13,title,summary,language,genres,authors')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"Summary, with comma",,Fantasy,"Tolkien, John"', lines[1])
+
+    def test_copies_jsonl_to_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'copies.jsonl')
+        call_command('export_catalog', 'copies', '--format', 'jsonl', '-o', path)
+        with open(path) as exported:
+            rows = [json.loads(line) for line in exported]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status'], 'a')
+        self.assertIsNone(rows[0]['borrower'])
@@ -0,0 +1,80 @@
+# // /catalog/tests/ test_db_router.py
+# // python manage.py test catalog.tests.test_db_router
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import db_router
+from catalog.cache import get_generation, get_model_generations
+from catalog.db_router import PIN_COOKIE, ReplicaRouter, read_from_replica, reading_from_replica
+from catalog.models import Book
+
+router = ReplicaRouter()
+
+
+@read_from_replica
+def routed_view(request):
+    return HttpResponse(router.db_for_read(Book))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        # // what ReplicaPinMiddleware does at the start of a request
+        db_router._state.pinned = db_router._state.wrote = db_router._state.read_replica = False
+        cache.clear()
+
+    def test_reads_default_outside_replica_views(self):
+        self.assertEqual(router.db_for_read(Book), 'default')
+
+    def test_catalog_reads_go_to_one_replica_per_request(self):
+        with reading_from_replica():
+            replica = router.db_for_read(Book)
+            self.assertIn(replica, ('replica1', 'replica2'))
+            self.assertEqual({router.db_for_read(Book) for _ in range(10)}, {replica})
+            self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_writes_go_to_default_and_pin_the_rest_of_the_request(self):
+        with reading_from_replica():
+            self.assertEqual(router.db_for_write(Book), 'default')
+            self.assertEqual(router.db_for_read(Book), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with reading_from_replica():
+            self.assertEqual(router.db_for_read(Book), 'default')
+
+    # // what a replica reader caches right after a write is keyed apart, so
+    # // it is not served once the replicas caught up
+    def test_generations_bumped_in_the_lag_window_are_keyed_apart(self):
+        book = Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+        generation = get_generation(Book, book.pk)
+        db_router._state.wrote = False
+        with reading_from_replica():
+            self.assertEqual(get_generation(Book, book.pk), (generation, 'replica'))
+            self.assertEqual(get_model_generations([Book])[0][1], 'replica')
+        self.assertEqual(get_generation(Book, book.pk), generation)
+        cache.delete(f'catalog:gen:catalog.book:{book.pk}:settling')
+        with reading_from_replica():
+            self.assertEqual(get_generation(Book, book.pk), generation)
+
+    def test_decorator_only_routes_safe_methods(self):
+        factory = RequestFactory()
+        self.assertIn(routed_view(factory.get('/')).content, (b'replica1', b'replica2'))
+        self.assertEqual(routed_view(factory.post('/')).content, b'default')
+
+    def test_write_sets_the_pin_cookie(self):
+        user = User.objects.create_user(username='patron', password='1X<ISRUkw+tuK')
+        book = Book.objects.create(title='Dune', summary='Summary', isbn='ISBN1')
+        self.client.force_login(user)
+        response = self.client.post(reverse('place-hold-url', args=[book.pk]))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+    def test_pin_cookie_keeps_reads_on_default(self):
+        self.client.cookies[PIN_COOKIE] = '1'
+        # // a replica read would fail: replica1 is not a configured database here
+        response = self.client.get(reverse('books-url'))
+        self.assertEqual(response.status_code, 200)
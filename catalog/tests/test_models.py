@@ -2,8 +2,11 @@
 # // run "python manage.py test" to test this file
 # // ie. => python manage.py test catalog.tests.test_models
 
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from django.test import TestCase
-from catalog.models import Author
+from catalog.isbn import normalize_isbn
+from catalog.models import Author, Book
 
 #// Create Tests for models.
 
@@ -65,3 +68,32 @@ class MyTestClass(TestCase):
         print("Method: test_one_plus_one_equals_two")
         self.assertEqual(1+1, 2)
 
+
+
+class BookIsbnTest(TestCase):
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('978-0-306-40615-7'), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957x'), '9780804429573')
+        self.assertIsNone(normalize_isbn('0-306-40615-3'))
+        self.assertIsNone(normalize_isbn('9780306406158'))
+        self.assertIsNone(normalize_isbn('ABCDEFG001'))
+        self.assertIsNone(normalize_isbn(''))
+
+    def test_save_sets_isbn13(self):
+        book = Book.objects.create(title='Title', summary='Summary', isbn='0306406152')
+        self.assertEqual(book.isbn13, '9780306406157')
+        book.isbn = 'not an isbn'
+        book.save(update_fields=['isbn'])
+        book.refresh_from_db()
+        self.assertIsNone(book.isbn13)
+
+    def test_isbn13_is_unique_but_invalid_isbns_are_not(self):
+        Book.objects.create(title='Title', summary='Summary', isbn='0306406152')
+        Book.objects.create(title='Title', summary='Summary', isbn='ABCDEFG001')
+        Book.objects.create(title='Title', summary='Summary', isbn='ABCDEFG001')
+        duplicate = Book(title='Title', summary='Summary', isbn='9780306406157')
+        with self.assertRaises(ValidationError):
+            duplicate.clean()
+        with self.assertRaises(IntegrityError):
+            duplicate.save()
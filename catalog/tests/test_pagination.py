@@ -0,0 +1,151 @@
+# // /catalog/tests/ test_pagination.py
+# // python manage.py test catalog.tests.test_pagination
+
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import CachedCountPaginator, KeysetPaginator
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # // duplicate last names so the tie-breaking columns matter
+        for number in range(23):
+            Author.objects.create(first_name=f'First {number % 4}', last_name=f'Last {number % 5}')
+        book = Book.objects.create(title='Book', summary='Summary', isbn='ISBN1')
+        for number in range(12):
+            due_back = None if number % 3 == 0 else datetime.date(2020, 1, 1) + datetime.timedelta(days=number % 4)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back)
+
+    def setUp(self):
+        # // the anonymous page cache would answer without a context
+        cache.clear()
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_forward_walk_matches_full_ordering(self):
+        paginator = KeysetPaginator(Author.objects.all(), 5, ['last_name', 'first_name'])
+        pages = self.walk(paginator)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        walked = [author.pk for page in pages for author in page]
+        self.assertEqual(walked, list(Author.objects.order_by('last_name', 'first_name', 'pk').values_list('pk', flat=True)))
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        paginator = KeysetPaginator(Author.objects.all(), 5, ['last_name', 'first_name'])
+        pages = self.walk(paginator)
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        first = paginator.page(pages[1].previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_nullable_key_and_uuid_pk(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 5, ['due_back'])
+        pages = self.walk(paginator)
+        walked = [copy.pk for page in pages for copy in page]
+        self.assertEqual(len(walked), 12)
+        self.assertEqual(len(set(walked)), 12)
+        due_dates = [copy.due_back for page in pages for copy in page]
+        self.assertEqual(due_dates[:4], [None] * 4)
+        self.assertEqual(due_dates[4:], sorted(due_dates[4:]))
+        self.assertEqual(list(paginator.page(pages[2].previous_cursor)), list(pages[1]))
+
+    def test_author_list_keyset_mode_has_no_count(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('authors-url') + '?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['my_author_list']), 10)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+        self.assertContains(response, '?cursor=')
+
+    @override_settings(CATALOG_PAGINATION='keyset')
+    def test_settings_switch_and_following_next_link(self):
+        response = self.client.get(reverse('authors-url'))
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('authors-url'), {'cursor': next_cursor})
+        self.assertEqual(len(response.context['my_author_list']), 10)
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+    # // NOT NULL keys must keep the index's plain order (no NULLS FIRST/LAST)
+    def test_nulls_clause_only_on_nullable_keys(self):
+        with CaptureQueriesContext(connection) as context:
+            KeysetPaginator(Author.objects.all(), 10, ['last_name', 'first_name']).page()
+            KeysetPaginator(BookInstance.objects.all(), 10, ['due_back']).page()
+            KeysetPaginator(BookInstance.objects.filter(due_back__isnull=False), 10, ['due_back'], ['due_back']).page()
+        author_sql, copy_sql, loan_sql = [query['sql'] for query in context.captured_queries]
+        self.assertNotIn('NULL', author_sql.split('ORDER BY')[1])
+        self.assertIn('NULL', copy_sql.split('ORDER BY')[1])
+        # // filtered to NOT NULL by the view: plain order, as in copy_on_loan_due_idx
+        self.assertNotIn('NULL', loan_sql.split('ORDER BY')[1])
+
+    def test_keyset_is_the_default_and_page_keeps_offset_links(self):
+        response = self.client.get(reverse('authors-url'))
+        self.assertTrue(response.context['page_obj'].is_keyset)
+        response = self.client.get(reverse('authors-url'), {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('authors-url') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_loaned_books_keyset_mode(self):
+        user = User.objects.create_user(username='librarian', password='2HJ1vRV0z&3iD')
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        BookInstance.objects.update(status='o', borrower=user)
+        # // loans always have a due date (the view skips any without)
+        BookInstance.objects.filter(due_back=None).update(due_back=datetime.date(2020, 1, 2))
+        self.client.force_login(user)
+        response = self.client.get(reverse('all-loan-url') + '?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['loan_books']), 10)
+        response = self.client.get(reverse('all-loan-url'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['loan_books']), 2)
+
+
+class CachedCountPaginatorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for number in range(3):
+            Author.objects.create(first_name='First', last_name=f'Last {number}')
+
+    def test_count_is_served_from_cache(self):
+        self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 3)
+
+    def test_filtered_querysets_are_cached_separately(self):
+        self.assertEqual(CachedCountPaginator(Author.objects.filter(last_name='Last 1'), 10).count, 1)
+        self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 3)
+
+    def test_write_invalidates_cached_count(self):
+        self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 3)
+        Author.objects.create(first_name='First', last_name='Last 3')
+        self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 4)
+
+    @override_settings(CATALOG_COUNT_ESTIMATE_THRESHOLD=1000)
+    def test_estimate_used_only_above_threshold(self):
+        with mock.patch('catalog.pagination._estimated_count', return_value=250000):
+            self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 250000)
+        cache.clear()
+        with mock.patch('catalog.pagination._estimated_count', return_value=10):
+            self.assertEqual(CachedCountPaginator(Author.objects.all(), 10).count, 3)
+
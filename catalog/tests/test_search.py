@@ -0,0 +1,80 @@
+# // /catalog/tests/ test_search.py
+# // python manage.py test catalog.tests.test_search
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.search import search_books
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        self.christie = Author.objects.create(first_name='Agatha', last_name='Christie')
+        self.tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.orient = Book.objects.create(
+            title='Murder on the Orient Express', summary='A detective story on a train.', isbn='9780007119318')
+        self.orient.author.set([self.christie])
+        self.hobbit = Book.objects.create(
+            title='The Hobbit', summary='A hobbit goes on an adventure with dwarves.', isbn='9780261103344')
+        self.hobbit.author.set([self.tolkien])
+        self.trains = Book.objects.create(
+            title='Trains of Europe', summary='Every train, and an express or two.', isbn='9781234567897')
+
+    def titles(self, query):
+        return [book.title for book in search_books(query)[:10]]
+
+    def test_search_title_summary_author_and_isbn(self):
+        self.assertEqual(self.titles('hobbit'), ['The Hobbit'])
+        self.assertEqual(self.titles('christie'), ['Murder on the Orient Express'])
+        self.assertEqual(self.titles('978-0-261-10334-4'), ['The Hobbit'])
+        self.assertEqual(self.titles('dwarves'), ['The Hobbit'])
+
+    def test_all_terms_must_match_and_last_is_prefix(self):
+        self.assertEqual(self.titles('agatha orie'), ['Murder on the Orient Express'])
+        self.assertEqual(self.titles('tolkien express'), [])
+
+    def test_title_match_ranks_above_summary_match(self):
+        self.assertEqual(self.titles('express'), ['Murder on the Orient Express', 'Trains of Europe'])
+        self.assertEqual(search_books('express').count(), 2)
+
+    def test_index_follows_book_and_author_changes(self):
+        self.tolkien.last_name = 'Tolkein'
+        self.tolkien.save()
+        self.assertEqual(self.titles('tolkein'), ['The Hobbit'])
+        self.hobbit.author.remove(self.tolkien)
+        self.assertEqual(self.titles('tolkein'), [])
+        self.christie.book_set.add(self.hobbit)
+        self.assertEqual(sorted(self.titles('christie')), ['Murder on the Orient Express', 'The Hobbit'])
+        self.hobbit.delete()
+        self.assertEqual(self.titles('hobbit'), [])
+
+    def test_punctuation_is_not_query_syntax(self):
+        self.assertEqual(self.titles('"hobbit" OR (NEAR'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    def test_search_page(self):
+        response = self.client.get(reverse('book-search-url'), {'q': 'hobbit'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'cat_temp/book_search.html')
+        self.assertEqual([book.title for book in response.context['my_book_list']], ['The Hobbit'])
+
+    def test_search_page_query_count_is_constant(self):
+        for number in range(15):
+            Book.objects.create(title=f'Train book {number}', summary='Summary', isbn=f'ISBN{number}').author.set([self.christie])
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('book-search-url'), {'q': 'train'})
+        self.assertEqual(len(response.context['my_book_list']), 10)
+
+    def test_search_api(self):
+        response = self.client.get(reverse('api-book-search-url'), {'q': 'orient'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['id'], self.orient.pk)
+        self.assertEqual(data['results'][0]['authors'], 'Agatha Christie')
+
+    def test_backend_is_full_text(self):
+        # // the default database must not fall back to icontains scans
+        self.assertIn(connection.vendor, ('sqlite', 'postgresql'))
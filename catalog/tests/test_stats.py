@@ -0,0 +1,151 @@
+# // /catalog/tests/ test_stats.py
+# // python manage.py test catalog.tests.test_stats
+
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import counters
+from catalog.counters import counter_drift, read_counters
+from catalog.models import Author, Book, BookInstance, Genre, Language, LibraryCounter
+from catalog.stats import get_library_stats
+from catalog.visits import flush_visits
+
+
+class LibraryStatsTest(TestCase):
+    def setUp(self):
+        # // locmem cache outlives the per-test rollback
+        cache.clear()
+        language = Language.objects.create(name='English')
+        self.mystery = Genre.objects.create(name='Mystery')
+        self.novel = Genre.objects.create(name='Novel')
+        Genre.objects.create(name='Poetry')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for number in range(3):
+            book = Book.objects.create(
+                title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}', language=language,
+            )
+            book.author.set([author])
+            book.genre.set([self.mystery] if number else [self.mystery, self.novel])
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a' if number else 'o')
+        cache.clear()
+
+    def test_counts(self):
+        stats = get_library_stats()
+        self.assertEqual(stats['num_authors'], 1)
+        self.assertEqual(stats['num_books'], 3)
+        self.assertEqual(stats['num_instances'], 3)
+        self.assertEqual(stats['num_inst_available'], 2)
+        self.assertEqual(stats['num_genre'], 3)
+        self.assertEqual(stats['genre_histogram'], [('Mystery', 3), ('Novel', 1), ('Poetry', 0)])
+
+    def test_second_call_is_served_from_cache(self):
+        get_library_stats()
+        with self.assertNumQueries(0):
+            get_library_stats()
+
+    def test_book_change_invalidates_cache(self):
+        self.assertEqual(get_library_stats()['num_books'], 3)
+        Book.objects.create(title='Another', summary='Summary', isbn='ISBN9')
+        self.assertEqual(get_library_stats()['num_books'], 4)
+
+    def test_genre_m2m_change_invalidates_cache(self):
+        get_library_stats()
+        Book.objects.get(title='Book 1').genre.add(self.novel)
+        self.assertIn(('Novel', 2), get_library_stats()['genre_histogram'])
+
+    def test_copy_status_change_invalidates_cache(self):
+        get_library_stats()
+        BookInstance.objects.filter(status='o').get().delete()
+        self.assertEqual(get_library_stats()['num_instances'], 2)
+
+    def test_index_renders_genre_histogram(self):
+        response = self.client.get(reverse('index-url'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Poetry: 0 titles')
+        self.assertEqual(response.context['num_books'], 3)
+        # // write the buffered visit into this test's database
+        flush_visits()
+
+
+class LibraryCounterTest(TestCase):
+    def setUp(self):
+        self.language = Language.objects.create(name='English')
+        self.genre = Genre.objects.create(name='Mystery')
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book', summary='Summary', isbn='ISBN1', language=self.language)
+        self.book.genre.set([self.genre])
+        self.book.author.set([self.author])
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def assertCountersInSync(self):
+        self.assertEqual(counter_drift(), {})
+
+    def test_counters_follow_creation(self):
+        values = read_counters()
+        self.assertEqual(values[counters.BOOKS], 1)
+        self.assertEqual(values[counters.COPIES], 1)
+        self.assertEqual(values[counters.AUTHORS], 1)
+        self.assertEqual(values[counters.copies_status_key('a')], 1)
+        self.assertEqual(values[counters.books_genre_key(self.genre.pk)], 1)
+        self.assertEqual(values[counters.books_language_key(self.language.pk)], 1)
+        self.assertCountersInSync()
+
+    def test_copy_status_change_moves_counter(self):
+        self.copy.status = 'o'
+        self.copy.save()
+        values = read_counters()
+        self.assertEqual(values[counters.copies_status_key('a')], 0)
+        self.assertEqual(values[counters.copies_status_key('o')], 1)
+        self.assertCountersInSync()
+
+    def test_m2m_changes_from_both_sides(self):
+        other_genre = Genre.objects.create(name='Novel')
+        self.book.genre.set([other_genre])
+        other_genre.book_set.add(Book.objects.create(title='Other', summary='Summary', isbn='ISBN2'))
+        # // removing a genre that is not linked must not decrement
+        self.book.genre.remove(self.genre)
+        self.assertEqual(read_counters()[counters.books_genre_key(other_genre.pk)], 2)
+        self.assertCountersInSync()
+        other_genre.book_set.clear()
+        self.assertCountersInSync()
+
+    # // post_init must not load deferred fields (it used to recurse until it crashed)
+    def test_partially_loaded_copies(self):
+        with self.assertNumQueries(1):
+            copy = BookInstance.objects.only('imprint').get(pk=self.copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(read_counters()[counters.copies_status_key('o')], 1)
+        self.assertCountersInSync()
+        self.copy.refresh_from_db(fields=['status'])
+        self.assertEqual(self.copy.status, 'o')
+        BookInstance.objects.only('imprint').get(pk=self.copy.pk).delete()
+        self.assertCountersInSync()
+
+    def test_deletes_keep_counters_in_sync(self):
+        self.book.language = None
+        self.book.save()
+        self.book.delete()
+        self.author.delete()
+        self.copy.delete()
+        self.assertCountersInSync()
+        self.assertEqual(read_counters()[counters.BOOKS], 0)
+
+    def test_stats_read_counters_not_tables(self):
+        cache.clear()
+        with self.assertNumQueries(2):
+            stats = get_library_stats()
+        self.assertEqual(stats['num_inst_available'], 1)
+
+    def test_rebuild_command_repairs_drift(self):
+        LibraryCounter.objects.filter(name=counters.BOOKS).update(value=42)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_library_stats', '--check', stdout=StringIO())
+        call_command('rebuild_library_stats', stdout=StringIO())
+        self.assertCountersInSync()
+        call_command('rebuild_library_stats', '--check', stdout=StringIO())
@@ -14,6 +14,16 @@ from catalog.models import BookInstance, Book, Genre, Language
 import uuid
 from django.contrib.auth.models import Permission
 
+# // query counting
+import json
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.test import modify_settings, override_settings
+from catalog.models import VisitCount
+from catalog.visits import flush_visits
+
 
 # //=====================================
 # // p10-3a> test simple view
@@ -28,6 +38,11 @@ class AuthorListViewTest(TestCase):
                 first_name=f'Christian {author_id}',
                 last_name=f'Surname {author_id}',
             )
+    
+    def setUp(self):
+        # // the anonymous page cache would answer without a template or context
+        cache.clear()
+        
     def test_view_url_exists_at_desired_location(self):
         response = self.client.get('/catalog/authors/')
         self.assertEqual(response.status_code, 200)
@@ -358,4 +373,444 @@ class AuthorCreateViewTest(TestCase):
         
     
     
-    
\ No newline at end of file
+    
+
+# //=========================================================
+# // book list & admin changelist: queries do not grow per row
+# //=========================================================
+class BookListQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK', email='')
+        cls.genres = [Genre.objects.create(name=f'Genre {number}') for number in range(4)]
+        cls.authors = [Author.objects.create(first_name='First', last_name=f'Last {number}') for number in range(4)]
+
+    def create_books(self, number_of_books):
+        for number in range(number_of_books):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}')
+            book.author.set(self.authors)
+            book.genre.set(self.genres)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_book_list_query_count_is_constant(self):
+        self.create_books(2)
+        few = self.count_queries(reverse('books-url'))
+        self.create_books(8)
+        self.assertEqual(self.count_queries(reverse('books-url')), few)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('admin:catalog_book_changelist')
+        self.create_books(2)
+        few = self.count_queries(url)
+        self.create_books(20)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_display_helpers_use_prefetched_relations(self):
+        self.create_books(1)
+        book = Book.objects.prefetch_related('author', 'genre').get()
+        with self.assertNumQueries(0):
+            self.assertEqual(book.display_author(), 'Last 0, Last 1, Last 2')
+            self.assertEqual(book.display_genre(), 'Genre 0, Genre 1, Genre 2')
+            self.assertEqual(len(book.display_all_authors().split(', ')), 4)
+
+
+# //=====================================
+# // batch availability API (scanners)
+# //=====================================
+class BookAvailabilityApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='0306406152')
+        for status in ('a', 'a', 'o', 'm'):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status)
+        Book.objects.create(title='No Copies', summary='Summary', isbn='9780261103344')
+
+    def post(self, payload):
+        return self.client.post(reverse('api-availability-url'), json.dumps(payload), content_type='application/json')
+
+    def test_counts_available_copies_per_isbn(self):
+        with self.assertNumQueries(1):
+            response = self.post({'isbns': ['978-0-306-40615-7', '9780261103344', '9780007119318', 'junk']})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0]['title'], 'Book Title')
+        self.assertEqual((results[0]['available'], results[0]['copies']), (2, 4))
+        self.assertEqual((results[1]['found'], results[1]['available']), (True, 0))
+        self.assertFalse(results[2]['found'])
+        self.assertIsNone(results[3]['isbn13'])
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('api-availability-url')).status_code, 405)
+        self.assertEqual(self.post({'isbn': []}).status_code, 400)
+        self.assertEqual(self.post({'isbns': [1, 2]}).status_code, 400)
+        with self.settings(CATALOG_AVAILABILITY_MAX_ISBNS=2):
+            self.assertEqual(self.post({'isbns': ['1', '2', '3']}).status_code, 400)
+
+
+# //=====================================================
+# // loan views read BookInstance through their indexes
+# //=====================================================
+class LoanQueryIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        for number in range(20):
+            BookInstance.objects.create(
+                book=book, imprint='Imprint', status='o' if number % 2 else 'a',
+                borrower=cls.user if number % 4 == 1 else None,
+                due_back=datetime.date.today() + datetime.timedelta(days=number),
+            )
+
+    # // plans of the queries the view sends for its first and second (keyset) page
+    def get_plans(self, view_class):
+        plans, cursor = [], ''
+        for _ in range(2):
+            view = view_class()
+            view.request = RequestFactory().get('/', {'cursor': cursor})
+            view.request.user = self.user
+            view.kwargs = {}
+            with CaptureQueriesContext(connection) as queries:
+                paginator, page, object_list, is_paginated = view.paginate_queryset(view.get_queryset(), 2)
+            cursor = page.next_cursor
+            with connection.cursor() as db_cursor:
+                if connection.vendor == 'postgresql':
+                    # // tiny test tables would otherwise always be scanned
+                    db_cursor.execute('SET LOCAL enable_seqscan = off')
+                db_cursor.execute(connection.ops.explain_query_prefix() + ' ' + queries[-1]['sql'])
+                plans.append('\n'.join(' '.join(map(str, row)) for row in db_cursor.fetchall()))
+        return plans
+
+    def assertIndexOrder(self, view_class, index):
+        for plan in self.get_plans(view_class):
+            self.assertIn(index, plan)
+            # // the index gives the page order: no sort of every loan
+            self.assertNotIn('TEMP B-TREE', plan)
+            self.assertNotIn('Sort', plan)
+
+    def test_user_loans_use_borrower_index(self):
+        from catalog.views import LoanedBooksByUserListView
+        self.assertIndexOrder(LoanedBooksByUserListView, 'copy_borrower_loans_idx')
+
+    def test_all_loans_use_partial_index(self):
+        from catalog.views import AllLoanedBooksView
+        self.assertIndexOrder(AllLoanedBooksView, 'copy_on_loan_due_idx')
+
+    def test_available_count_uses_status_index(self):
+        plan = BookInstance.objects.filter(status__exact='a').explain()
+        self.assertIn('copy_available_idx', plan)
+
+
+# //=====================================
+# // streaming exports (staff only)
+# //=====================================
+class ExportViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        cls.librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_redirect_if_no_permission(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export-url', args=['authors', 'csv']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_csv_and_jsonl(self):
+        self.client.force_login(self.librarian)
+        response = self.client.get(reverse('export-url', args=['authors', 'csv']))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('John,Smith', content)
+        response = self.client.get(reverse('export-url', args=['authors', 'jsonl']))
+        row = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual(row['last_name'], 'Smith')
+
+    def test_unknown_export_is_404(self):
+        self.client.force_login(self.librarian)
+        self.assertEqual(self.client.get(reverse('export-url', args=['users', 'csv'])).status_code, 404)
+
+
+# //=============================================
+# // detail pages: ETag/Last-Modified & 304s
+# //=============================================
+# // the views' own validators, without the anonymous page cache in front
+@modify_settings(MIDDLEWARE={'remove': ['catalog.page_cache.AnonymousPageCacheMiddleware']})
+class DetailConditionalGetTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.book.author.set([self.author])
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def assertNotModified(self, url, etag, expected=True):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304 if expected else 200)
+
+    def test_book_detail_304_runs_one_query(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            self.assertNotModified(url, response['ETag'])
+
+    def test_copy_change_touches_book(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        BookInstance.objects.get(pk=self.copy.pk).save()
+        self.assertNotModified(url, etag, expected=False)
+        etag = self.client.get(url)['ETag']
+        self.copy.delete()
+        self.assertNotModified(url, etag, expected=False)
+
+    def test_author_page_follows_its_books_and_copies(self):
+        url = reverse('author-detail-url', args=[self.author.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.assertNotModified(url, etag, expected=False)
+
+    def test_etag_differs_per_user(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK'))
+        self.assertNotModified(url, etag, expected=False)
+
+    # // a 304 would keep the page's hold form with the token of the last session
+    def test_etag_changes_when_the_csrf_token_rotates(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        self.client.logout()
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertNotModified(url, etag, expected=False)
+
+    def test_missing_object_is_404(self):
+        self.assertEqual(self.client.get(reverse('book-detail-url', args=[999])).status_code, 404)
+
+
+class DetailFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        self.book.author.set([self.author])
+        self.copy = BookInstance.objects.create(book=self.book, imprint='First Imprint', status='a')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_book_fragments_served_from_cache(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        response, cold = self.count_queries(url)
+        self.assertContains(response, 'First Imprint')
+        response, warm = self.count_queries(url)
+        self.assertContains(response, 'First Imprint')
+        self.assertLess(warm, cold)
+
+    def test_copy_change_bumps_book_generation(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        self.client.get(url)
+        self.copy.imprint = 'Second Imprint'
+        self.copy.save()
+        self.assertContains(self.client.get(url), 'Second Imprint')
+
+    def test_author_rename_bumps_book_generation(self):
+        url = reverse('book-detail-url', args=[self.book.pk])
+        self.client.get(url)
+        self.author.last_name = 'Jones'
+        self.author.save()
+        self.assertContains(self.client.get(url), 'John Jones')
+
+    def test_author_page_book_blocks(self):
+        url = reverse('author-detail-url', args=[self.author.pk])
+        self.assertContains(self.client.get(url), 'copy,')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.assertContains(self.client.get(url), 'copies,')
+
+
+class AuthorDetailQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def add_books(self, number):
+        for number in range(number):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number:09}')
+            book.author.add(self.author)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('author-detail-url', args=[self.author.pk]))
+        return response, len(queries)
+
+    def test_query_count_independent_of_books(self):
+        self.add_books(2)
+        response, few = self.count_queries()
+        self.add_books(20)
+        response, many = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['num_books'], 22)
+
+    def test_copy_counts_annotated(self):
+        self.add_books(1)
+        response, queries = self.count_queries()
+        book = response.context['author_books'][0]
+        self.assertEqual((book.num_copies, book.num_available), (2, 1))
+        self.assertContains(response, '1 available')
+
+
+class BookDetailQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title='Book Title', summary='Summary', isbn='ABCDEFG001',
+            language=Language.objects.create(name='English'))
+        self.book.author.add(Author.objects.create(first_name='John', last_name='Smith'))
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+
+    def add_copies(self, number, status='a', due_back=None):
+        BookInstance.objects.bulk_create([
+            BookInstance(book=self.book, imprint='Imprint', status=status, due_back=due_back)
+            for number in range(number)
+        ])
+
+    def count_queries(self, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-detail-url', args=[self.book.pk]), params)
+        return response, len(queries)
+
+    def test_query_count_independent_of_copies(self):
+        self.add_copies(2)
+        response, few = self.count_queries()
+        self.add_copies(200)
+        response, many = self.count_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['copies_page']), 50)
+
+    def test_copy_summary(self):
+        soon, later = datetime.date.today(), datetime.date.today() + datetime.timedelta(weeks=2)
+        self.add_copies(3, status='a')
+        self.add_copies(1, status='o', due_back=later)
+        self.add_copies(1, status='o', due_back=soon)
+        response, queries = self.count_queries()
+        summary = {row['status']: (row['count'], row['earliest_due']) for row in response.context['copy_summary']}
+        self.assertEqual(summary, {'a': (3, None), 'o': (2, soon), 'm': (0, None), 'r': (0, None)})
+        self.assertEqual(response.context['copies_page'].paginator.count, 5)
+
+    def test_copies_are_paginated(self):
+        self.add_copies(60)
+        response, queries = self.count_queries(copies_page=2)
+        self.assertEqual(response.context['copies_page'].number, 2)
+        self.assertEqual(len(response.context['copies_page']), 10)
+        response, queries = self.count_queries(copies_page='x')
+        self.assertEqual(response.context['copies_page'].number, 1)
+
+
+class BatchRenewLoansTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.client.force_login(librarian)
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG001')
+        due = datetime.date.today() + datetime.timedelta(days=5)
+        self.loans = [
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due, borrower=self.borrower, status='o')
+            for number in range(3)
+        ]
+        self.shelved = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.renewal = datetime.date.today() + datetime.timedelta(weeks=2)
+
+    def renew(self, **data):
+        return self.client.post(reverse('renew-loans-url'), {'due_back': self.renewal.isoformat(), **data})
+
+    def test_redirect_without_permission(self):
+        self.client.force_login(self.borrower)
+        self.assertEqual(self.renew(copies=[str(self.loans[0].pk)]).status_code, 302)
+
+    def test_selected_loans_renewed_with_one_update(self):
+        missing = uuid.uuid4()
+        copies = [str(self.loans[0].pk), str(self.loans[1].pk), str(self.shelved.pk), str(missing)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.renew(copies=copies)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "catalog_bookinstance"') for query in queries), 1)
+        report = [(row['copy_id'], row['renewed'], row['reason']) for row in response.context['report']]
+        self.assertEqual(report, [
+            (self.loans[0].pk, True, None),
+            (self.loans[1].pk, True, None),
+            (self.shelved.pk, False, 'not on loan'),
+            (missing, False, 'not found'),
+        ])
+        self.assertEqual(BookInstance.objects.filter(due_back=self.renewal).count(), 2)
+
+    def test_all_loans_of_borrower(self):
+        response = self.renew(borrower='testuser1')
+        self.assertEqual(response.context['num_renewed'], 3)
+        self.assertEqual(BookInstance.objects.filter(due_back=self.renewal, borrower=self.borrower).count(), 3)
+
+    def test_renewal_date_rule(self):
+        for days in (-1, 29):
+            with self.subTest(days=days):
+                response = self.client.post(reverse('renew-loans-url'), {
+                    'due_back': (datetime.date.today() + datetime.timedelta(days=days)).isoformat(),
+                    'copies': [str(self.loans[0].pk)],
+                })
+                self.assertTrue(response.context['form'].errors['due_back'])
+                self.assertIsNone(response.context['report'])
+        self.assertFalse(BookInstance.objects.filter(due_back=self.renewal).exists())
+
+
+class IndexVisitsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        flush_visits()
+        VisitCount.objects.all().delete()
+
+    def tearDown(self):
+        flush_visits(['index'])
+
+    def visit(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index-url'))
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+        return response
+
+    @override_settings(CATALOG_VISIT_FLUSH_EVERY=3, CATALOG_VISIT_FLUSH_INTERVAL=3600)
+    def test_visits_flushed_in_batches(self):
+        for number in range(2):
+            self.assertEqual(self.visit().context['num_visits'], number)
+        self.assertFalse(VisitCount.objects.exists())
+        self.assertEqual(self.visit().context['num_visits'], 2)
+        self.assertEqual(VisitCount.objects.get(page='index').count, 3)
+
+    @override_settings(CATALOG_VISIT_BUFFER='cache', CATALOG_VISIT_FLUSH_EVERY=3, CATALOG_VISIT_FLUSH_INTERVAL=3600)
+    def test_cache_buffer(self):
+        for number in range(4):
+            self.visit()
+        # // the first visit starts the flush timer, the 4th fills a batch of 3
+        self.assertEqual(VisitCount.objects.get(page='index').count, 4)
+        self.visit()
+        flush_visits(['index'])
+        self.assertEqual(VisitCount.objects.get(page='index').count, 5)
+
+    def test_tampered_cookie_restarts_count(self):
+        self.client.cookies['num_visits'] = '41'
+        self.assertEqual(self.visit().context['num_visits'], 0)
@@ -1,7 +1,7 @@
 # // /catalog/urls.py
 
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='index-url'),
@@ -14,6 +14,25 @@ urlpatterns += [
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail-url'),
 ]
 
+# // full-text search
+urlpatterns += [
+    path('search/', views.BookSearchView.as_view(), name='book-search-url'),
+    path('api/search/', views.book_search_api, name='api-book-search-url'),
+]
+
+# // read-only JSON API, v1 (catalog/api.py)
+urlpatterns += [
+    path('api/v1/books/', api.book_list, name='api-v1-books-url'),
+    path('api/v1/books/<int:pk>/', api.book_detail, name='api-v1-book-detail-url'),
+    path('api/v1/authors/', api.author_list, name='api-v1-authors-url'),
+    path('api/v1/authors/<int:pk>/', api.author_detail, name='api-v1-author-detail-url'),
+]
+
+# // circulation desk scanners
+urlpatterns += [
+    path('api/availability/', views.book_availability_api, name='api-availability-url'),
+]
+
 # // p8> add borrower books
 urlpatterns += [
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-loan-url'),
@@ -23,6 +42,20 @@ urlpatterns += [
 # // p9> form for renew book
 urlpatterns += [
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-url'),
+    path('books-in-loan/renew/', views.renew_loans_librarian, name='renew-loans-url'),
+]
+
+# // circulation desk: checkout / return / renew; patron holds
+urlpatterns += [
+    path('circulation/', views.circulation_desk, name='circulation-desk-url'),
+    path('api/circulation/', views.circulation_api, name='api-circulation-url'),
+    path('book/<int:pk>/hold/', views.place_hold_view, name='place-hold-url'),
+    path('hold/<int:pk>/cancel/', views.cancel_hold_view, name='cancel-hold-url'),
+]
+
+# // streaming CSV/JSONL exports (staff)
+urlpatterns += [
+    path('export/<slug:kind>.<slug:file_format>', views.export_catalog, name='export-url'),
 ]
 
 # // p9> form for editing author
@@ -2,7 +2,15 @@
 
 # //p5> create view for home page
 from django.shortcuts import render
-from catalog.models import Author, Book, BookInstance, Genre
+from catalog.models import Author, Book, BookInstance
+from catalog.stats import get_library_stats
+from catalog.visits import record_visit
+from catalog.pagination import CachedCountPaginator, KeysetPaginationMixin, KnownCountPaginator
+from catalog.search import search_books
+from catalog.conditional import ConditionalGetMixin
+from catalog.cache import fragment_cache_timeout, get_generation, get_generations
+from catalog.page_cache import PageCacheMixin
+from catalog.db_router import ReplicaReadMixin, read_from_replica
 
 # //p6> create html views
 from django.views import generic
@@ -19,46 +27,76 @@ from django.http import HttpResponseRedirect
 from django.urls import reverse
 from catalog.forms import RenewBookForm, RenewBookModelForm
 
+# // batch renewal
+from catalog.forms import BatchRenewForm
+from catalog.circulation import renew_loans
+
+# // circulation desk
+from catalog.forms import CirculationForm
+from catalog.circulation import CirculationError, checkout, renew, return_copy
+
+# // holds
+from catalog.models import Hold
+from catalog.circulation import cancel_hold, place_hold
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
 # //p9-2> edit renew books
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 
+# // search page & JSON API
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+
+# // batch availability API for the circulation desk scanners
+import json
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from catalog.isbn import normalize_isbn
+
+# // streaming exports
+from django.http import Http404, StreamingHttpResponse
+from catalog.exports import CONTENT_TYPES, EXPORTS, export_lines
+
+
+
+# // per-visitor home page count (signed, so it cannot be edited by hand)
+VISITS_COOKIE = 'num_visits'
 
 
 # // p5: create home page of site
+@read_from_replica
 def index(request):
-    num_authors = Author.objects.all().count()
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    num_genre = Genre.objects.all().count()
-    num_mystery_book = Book.objects.filter(genre__name='Mystery').count()
-    num_novel_book = Book.objects.filter(genre__name='Novel').count()
-    num_sci_book = Book.objects.filter(genre__name='Science & Math').count()
-    
-    # // p7> counting sessions & record as cookies
-    # // change key_name, will recount the cookie/sessions
-    num_visits_counts = request.session.get('num_visits_key', 0)
-    request.session['num_visits_key'] = num_visits_counts + 1
+    # // all catalog counts come from the cached stats service (catalog/stats.py)
+    stats = get_library_stats()
+    
+    # // p7> counting visits & record as cookies
+    # // the visitor's own count lives in a signed cookie and the site total in a
+    # // buffered counter (catalog/visits.py): no session row is read or written
+    try:
+        num_visits_counts = int(request.get_signed_cookie(VISITS_COOKIE, default=0, salt=VISITS_COOKIE))
+    except ValueError:
+        num_visits_counts = 0
+    record_visit('index')
     
     context = {
         'num_visits': num_visits_counts,
-        
-        'num_authors': num_authors,
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_inst_available': num_instances_available,
-        'num_genre': num_genre,
-        'num_mystery': num_mystery_book,
-        'num_novel': num_novel_book,
-        'num_sci': num_sci_book,
+        **stats,
     }
     
-    return render(request, 'cat_temp/index.html', context=context)
+    response = render(request, 'cat_temp/index.html', context=context)
+    response.set_signed_cookie(
+        VISITS_COOKIE, num_visits_counts + 1, salt=VISITS_COOKIE, max_age=365 * 24 * 60 * 60, httponly=True)
+    return response
     
 
 # // p6-1: create List view
-class BookListView(generic.ListView):
+class BookListView(ReplicaReadMixin, PageCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     # // name to link with html
     template_name = 'cat_temp/book_list.html'
@@ -66,66 +104,248 @@ class BookListView(generic.ListView):
     # // by defualt, it is 'book'
     context_object_name = 'my_book_list'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
+    # // Book has no Meta.ordering, so give the cursor paginator a key
+    keyset_ordering = ('title', 'pk')
+    
+    # // authors & genres for the whole page in 2 queries (not 1 per book)
+    def get_queryset(self):
+        return Book.objects.prefetch_related('author', 'genre')
 
     # get 5 specific book title with chemistry
     # def get_queryset(self):
     #     return Book.objects.filter(title__icontains='chemistry')[:5]
     # to override the method use get_queryset
     # queryset = Book.objects.filter(title__icontains='chemistry')[:5]
-class AuthorListView(generic.ListView):
+class AuthorListView(ReplicaReadMixin, PageCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Author
     template_name = 'cat_temp/author_list.html'
     context_object_name = 'my_author_list'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
+    
+    
+# // full-text search over title, summary, authors & ISBN (catalog/search.py)
+class BookSearchView(generic.ListView):
+    template_name = 'cat_temp/book_search.html'
+    context_object_name = 'my_book_list'
+    paginate_by = 10
+    
+    def get_queryset(self):
+        return search_books(self.request.GET.get('q', '').strip())
     
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.object_list.query
+        return context
+
+
+def book_search_api(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_books(query), 20)
+    page = paginator.get_page(request.GET.get('page'))
+    return JsonResponse({
+        'query': query,
+        'count': paginator.count,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'results': [
+            {
+                'id': book.pk,
+                'title': book.title,
+                'authors': book.display_all_authors(),
+                'isbn': book.isbn,
+                'url': book.get_absolute_url(),
+                'rank': book.search_rank,
+            }
+            for book in page.object_list
+        ],
+    })
+
+
+# // POST {"isbns": ["978...", "0-306-40615-2", ...]}
+# // -> available/total copies per ISBN, all titles in one grouped query
+# // read-only, so scanners may post without a CSRF token
+@csrf_exempt
+@require_POST
+def book_availability_api(request):
+    try:
+        isbns = json.loads(request.body.decode())['isbns']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON body like {"isbns": [...]}.'}, status=400)
+    max_isbns = getattr(settings, 'CATALOG_AVAILABILITY_MAX_ISBNS', 1000)
+    if not isinstance(isbns, list) or len(isbns) > max_isbns or not all(isinstance(isbn, str) for isbn in isbns):
+        return JsonResponse({'error': f'"isbns" must be a list of at most {max_isbns} ISBNs.'}, status=400)
     
+    normalized = {isbn: normalize_isbn(isbn) for isbn in isbns}
+    rows = (
+        Book.objects.filter(isbn13__in={isbn13 for isbn13 in normalized.values() if isbn13})
+        .order_by()
+        .values('isbn13', 'pk', 'title')
+        .annotate(copies=Count('bookinstance'), available=Count('bookinstance', filter=Q(bookinstance__status='a')))
+    )
+    books = {row['isbn13']: row for row in rows}
+    
+    results = []
+    for isbn, isbn13 in normalized.items():
+        book = books.get(isbn13)
+        results.append({
+            'isbn': isbn,
+            'isbn13': isbn13,
+            'found': book is not None,
+            'book_id': book['pk'] if book else None,
+            'title': book['title'] if book else None,
+            'copies': book['copies'] if book else 0,
+            'available': book['available'] if book else 0,
+        })
+    return JsonResponse({'results': results})
+
+
 # // p6-2: create Detail view  
 # // error cuz it's belogn to DetailView
 # class BookDetailView(generic.ListView):
-class BookDetailView(generic.DetailView):
+class BookDetailView(ReplicaReadMixin, PageCacheMixin, ConditionalGetMixin, generic.DetailView):
     model = Book
     template_name = 'cat_temp/book_detail.html'
     context_object_name = 'select_book'
     
+    # // ETag/Last-Modified: Book.updated_at (touched by copy, genre & author-link
+    # // changes) + its authors' updated_at, in one query before rendering
+    def get_validator_stamps(self):
+        return Book.objects.filter(pk=self.kwargs['pk']).annotate(
+            authors_updated=Max('author__updated_at'), num_authors=Count('author'),
+        ).values_list('updated_at', 'authors_updated', 'num_authors').first()
+    
+    copies_paginate_by = 50
+    copies_page_kwarg = 'copies_page'
+    
+    def get_queryset(self):
+        return Book.objects.select_related('language').prefetch_related('author', 'genre')
+    
+    # // one GROUP BY status row per status, every status listed even without copies
+    def get_copy_summary(self):
+        rows = {
+            row['status']: row
+            for row in self.object.bookinstance_set.order_by().values('status').annotate(
+                count=Count('pk'), earliest_due=Min('due_back'))
+        }
+        labels = dict(BookInstance.LOAN_STATUS)
+        return [
+            {
+                'status': status,
+                'label': labels[status],
+                'count': rows[status]['count'] if status in rows else 0,
+                'earliest_due': rows[status]['earliest_due'] if status in rows else None,
+            }
+            for status in ('a', 'o', 'm', 'r')
+        ]
+    
+    # // the total comes from the summary; the page's rows are only read when
+    # // the copies fragment is not cached
+    def get_copies_page(self, total):
+        copies = self.object.bookinstance_set.order_by('due_back', 'pk')
+        paginator = KnownCountPaginator(copies, self.copies_paginate_by, total)
+        return paginator.get_page(self.request.GET.get(self.copies_page_kwarg))
+    
+    # // the authors & copies fragments are cached under the book's generation
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        summary = self.get_copy_summary()
+        context['copy_summary'] = summary
+        context['copies_page'] = self.get_copies_page(sum(row['count'] for row in summary))
+        context['book_generation'] = get_generation(Book, self.object.pk)
+        context['fragment_cache_timeout'] = fragment_cache_timeout()
+        return context
+    
 
 # class AuthorDetailView(generic.ListView):
 # // error cuz it's belogn to DetailView
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ReplicaReadMixin, PageCacheMixin, ConditionalGetMixin, generic.DetailView):
     model = Author
     template_name = 'cat_temp/author_detail.html'
     context_object_name = 'select_author'
     
+    # // the author + the books (and their copy counts) listed on the page
+    def get_validator_stamps(self):
+        return Author.objects.filter(pk=self.kwargs['pk']).annotate(
+            books_updated=Max('book__updated_at'), num_books=Count('book'),
+        ).values_list('updated_at', 'books_updated', 'num_books').first()
+    
+    # // the author's books with their copy counts: one query whatever the bibliography size
+    def get_author_books(self):
+        return self.object.book_set.annotate(
+            num_copies=Count('bookinstance'),
+            num_available=Count('bookinstance', filter=Q(bookinstance__status__exact='a')),
+        ).order_by('title', 'pk')
+    
+    # // one block per book, cached under that book's generation
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        books = list(self.get_author_books())
+        generations = get_generations(Book, [book.pk for book in books])
+        for book in books:
+            book.cache_generation = generations[book.pk]
+        context['author_books'] = books
+        context['num_books'] = len(books)
+        context['fragment_cache_timeout'] = fragment_cache_timeout()
+        return context
+    
+    # // anonymous page cache: the author and every book listed
+    def get_page_cache_dependencies(self, context):
+        return super().get_page_cache_dependencies(context) + [(Book, book.pk) for book in context['author_books']]
+    
 
 # // VIP: LoginRequiredMinxin put before generic.ListView;
 # class LoanedBooksByUserListView(generic.ListView, LoginRequiredMixin):
 # // else will show TypeError ~~~~
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(ReplicaReadMixin, LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'cat_temp/user_loan.html'
     context_object_name = 'loan_books'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
+    # // loans always have a due date: keyset order due_back, id as in the indexes
+    keyset_not_null = ['due_back']
     
     def get_queryset(self):
         # // crash for filter borrower
         # //TypeError: 'AnonymousUser' object is not iterable
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(
+            status__exact='o', due_back__isnull=False).order_by('due_back')
+    
+    # // the patron's active holds with their place in each queue, in one query:
+    # // position = 1 + waiting holds of the same book placed before it
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        ahead = Hold.objects.filter(
+            book=OuterRef('book'), status__exact='w',
+        ).filter(
+            Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), pk__lt=OuterRef('pk'))
+        ).order_by().values('book').annotate(n=Count('pk')).values('n')
+        context['holds'] = Hold.objects.filter(
+            patron=self.request.user, status__in=('w', 'r'),
+        ).select_related('book').annotate(position=Coalesce(Subquery(ahead), 0) + 1).order_by('created_at', 'pk')
+        return context
 
 
 # m1> class AllLoanedBooksView(generic.ListView): 
 # // p8challenge> to use permission
-class AllLoanedBooksView(PermissionRequiredMixin, generic.ListView):
+class AllLoanedBooksView(ReplicaReadMixin, PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'cat_temp/users_loan_all.html'
     context_object_name = 'loan_books'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
+    keyset_not_null = ['due_back']
     # // all-loaned-books only visible to user who has permission
     permission_required = 'catalog.can_mark_returned'
     
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(status__exact='o', due_back__isnull=False).order_by('due_back')
 
 
 # // p9-1> need to have permission to renew book
+# // reads and writes on the primary: the form shows the due date it changes
 @permission_required('catalog.can_mark_returned')
 def renew_book_librarian(request, pk):
     book_instance = get_object_or_404(BookInstance, pk=pk)
@@ -160,6 +380,136 @@ def renew_book_librarian(request, pk):
     return render(request, 'cat_temp/renew_book.html', context)
     
 
+# // batch renewal on top of the all-loans page: the ticked loans and/or all
+# // loans of one borrower, renewed with a single UPDATE (catalog/circulation.py)
+@permission_required('catalog.can_mark_returned')
+def renew_loans_librarian(request):
+    report = None
+    if request.method == 'POST':
+        form = BatchRenewForm(request.POST)
+        if form.is_valid():
+            requested = list(dict.fromkeys(form.cleaned_data['copies']))
+            borrower = form.cleaned_data['borrower']
+            selected = Q(pk__in=requested)
+            if borrower is not None:
+                selected |= Q(borrower=borrower, status__exact='o')
+            results = renew_loans(
+                BookInstance.objects.filter(selected), form.cleaned_data['due_back'], request.user, requested)
+            copies = BookInstance.objects.select_related('book', 'borrower').in_bulk([pk for pk, reason in results])
+            report = [
+                {'copy_id': pk, 'copy': copies.get(pk), 'renewed': reason is None, 'reason': reason}
+                for pk, reason in results
+            ]
+    else:
+        form = BatchRenewForm(initial={
+            'due_back': datetime.date.today() + datetime.timedelta(weeks=3),
+            'borrower': request.GET.get('borrower', ''),
+        })
+    
+    context = {
+        'form': form,
+        'report': report,
+        'num_renewed': sum(row['renewed'] for row in report) if report else 0,
+    }
+    return render(request, 'cat_temp/renew_loans.html', context)
+    
+
+# // circulation desk: one copy per request, page & JSON (catalog/circulation.py)
+def _circulate(form, user):
+    data = form.cleaned_data
+    if data['action'] == 'checkout':
+        return checkout(data['borrower'], book_id=data['book'], copy_id=data['copy'], due_back=data['due_back'], user=user)
+    if data['action'] == 'return':
+        return return_copy(data['copy'], user=user)
+    return renew(data['copy'], data['due_back'], user=user)
+
+
+@permission_required('catalog.can_mark_returned')
+def circulation_desk(request):
+    copy = error = None
+    if request.method == 'POST':
+        form = CirculationForm(request.POST)
+        if form.is_valid():
+            try:
+                copy = _circulate(form, request.user)
+            except CirculationError as exc:
+                error = str(exc)
+    else:
+        form = CirculationForm(initial={'action': request.GET.get('action', 'checkout')})
+    
+    context = {
+        'form': form,
+        'copy': copy,
+        'error': error,
+    }
+    return render(request, 'cat_temp/circulation_desk.html', context)
+
+
+# // patrons queue for a title from its detail page
+@login_required
+@require_POST
+def place_hold_view(request, pk):
+    book = get_object_or_404(Book, pk=pk)
+    try:
+        place_hold(book.pk, request.user)
+    except CirculationError as exc:
+        messages.error(request, str(exc))
+    return HttpResponseRedirect(reverse('my-loan-url'))
+
+
+@login_required
+@require_POST
+def cancel_hold_view(request, pk):
+    hold = get_object_or_404(Hold, pk=pk, patron=request.user)
+    try:
+        cancel_hold(hold)
+    except CirculationError as exc:
+        messages.error(request, str(exc))
+    return HttpResponseRedirect(reverse('my-loan-url'))
+
+
+# // POST {"action": "checkout", "book": 12, "borrower": "alice"}
+# //      {"action": "return", "copy": "<uuid>"}
+# //      {"action": "renew", "copy": "<uuid>", "due_back": "2020-05-01"}
+# // -> the copy as it is now; 409 when the copy cannot take that action
+# // session-authenticated, so it keeps the CSRF check (X-CSRFToken header)
+@require_POST
+def circulation_api(request):
+    if not request.user.has_perm('catalog.can_mark_returned'):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    try:
+        data = json.loads(request.body.decode())
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object.'}, status=400)
+    form = CirculationForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    try:
+        copy = _circulate(form, request.user)
+    except CirculationError as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+    return JsonResponse({
+        'copy': str(copy.pk),
+        'book_id': copy.book_id,
+        'status': copy.status,
+        'borrower': copy.borrower.username if copy.borrower_id else None,
+        'due_back': copy.due_back.isoformat() if copy.due_back else None,
+    })
+    
+
+# // /catalog/export/books.csv, authors.jsonl, copies.csv ...
+# // streamed row by row: the first byte goes out before the whole table is read
+@permission_required('catalog.can_mark_returned')
+def export_catalog(request, kind, file_format):
+    if kind not in EXPORTS or file_format not in CONTENT_TYPES:
+        raise Http404('Unknown export')
+    response = StreamingHttpResponse(export_lines(kind, file_format), content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{file_format}"'
+    return response
+    
+
 # // p9-2a> create/edit/delete author records
 # m1> class AuthorCreate(CreateView):
 # // challenge to get author create/update/delete with special permission
@@ -0,0 +1,140 @@
+# // /catalog/visits.py
+# // Page visit counting without a database write per request.
+# // record_visit() only bumps a buffered counter; the buffer is flushed to
+# // VisitCount rows (one per page and day) in batches, every
+# // CATALOG_VISIT_FLUSH_EVERY visits or CATALOG_VISIT_FLUSH_INTERVAL seconds.
+# // settings.CATALOG_VISIT_BUFFER:
+# //   'process' (default)  a counter in each worker process, flushed at exit too
+# //   'cache'              shared counters in the default cache (memcached/Redis:
+# //                        atomic incr), so counts survive worker restarts
+
+import atexit
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from catalog.models import VisitCount
+
+CACHE_PREFIX = 'catalog:visits'
+
+_lock = threading.Lock()
+_buffer = collections.Counter()
+_last_flush = time.monotonic()
+
+
+def _flush_every():
+    return getattr(settings, 'CATALOG_VISIT_FLUSH_EVERY', 100)
+
+
+def _flush_interval():
+    return getattr(settings, 'CATALOG_VISIT_FLUSH_INTERVAL', 60)
+
+
+def _store(counts):
+    # // {page: n} -> one UPDATE per page (today's row), INSERT the first time
+    day = timezone.localdate()
+    for page, number in counts.items():
+        if not number:
+            continue
+        updated = VisitCount.objects.filter(page=page, day=day).update(count=F('count') + number)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                VisitCount.objects.create(page=page, day=day, count=number)
+        except IntegrityError:
+            VisitCount.objects.filter(page=page, day=day).update(count=F('count') + number)
+
+
+# //=====================================
+# // process-local buffer
+# //=====================================
+def _record_local(page):
+    global _last_flush
+    with _lock:
+        _buffer[page] += 1
+        due = sum(_buffer.values()) >= _flush_every() or time.monotonic() - _last_flush >= _flush_interval()
+        if not due:
+            return
+        counts = dict(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    _store(counts)
+
+
+def _flush_local():
+    global _last_flush
+    with _lock:
+        counts = dict(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    _store(counts)
+
+
+# //=====================================
+# // cache-backed buffer
+# //=====================================
+def _cache_key(page):
+    return f'{CACHE_PREFIX}:{page}'
+
+
+def _record_cached(page):
+    key = _cache_key(page)
+    try:
+        pending = cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        pending = cache.incr(key)
+    # // the timer key only exists for flush_interval seconds after a flush
+    if pending >= _flush_every() or cache.add(f'{key}:timer', 1, _flush_interval()):
+        _flush_cached([page])
+
+
+def _flush_cached(pages):
+    for page in pages:
+        key = _cache_key(page)
+        # // one flusher per page at a time; visits counted meanwhile stay in the cache
+        if not cache.add(f'{key}:flushing', 1, 30):
+            continue
+        try:
+            pending = cache.get(key) or 0
+            if pending:
+                cache.decr(key, pending)
+                _store({page: pending})
+        finally:
+            cache.delete(f'{key}:flushing')
+
+
+# //=====================================
+# // API
+# //=====================================
+def _use_cache():
+    return getattr(settings, 'CATALOG_VISIT_BUFFER', 'process') == 'cache'
+
+
+def record_visit(page):
+    if _use_cache():
+        _record_cached(page)
+    else:
+        _record_local(page)
+
+
+# // write out whatever is buffered (tests, shutdown); the cache buffer is
+# // shared, so it needs the names of the pages to flush
+def flush_visits(pages=()):
+    if _use_cache():
+        _flush_cached(pages)
+    else:
+        _flush_local()
+
+
+@atexit.register
+def _flush_at_exit():
+    if not _use_cache():
+        _flush_local()
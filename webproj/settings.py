@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -45,7 +47,7 @@ ALLOWED_HOSTS = ['web-gitlib.herokuapp.com', '127.0.0.1']
 # Application definition
 
 INSTALLED_APPS = [
-    'catalog',
+    'catalog.apps.CatalogConfig',
     
     'django.contrib.admin',
     'django.contrib.auth',
@@ -66,6 +68,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    
+    # // keeps a visitor on the primary right after a write (catalog/db_router.py)
+    'catalog.db_router.ReplicaPinMiddleware',
+    # // whole pages for anonymous visitors (catalog/page_cache.py)
+    'catalog.page_cache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'webproj.urls'
@@ -123,6 +130,11 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# // permission sets are cached across requests (catalog/auth_backends.py),
+# // only when CACHES is shared by all processes (not locmem)
+AUTHENTICATION_BACKENDS = ['catalog.auth_backends.CachedPermissionBackend']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -137,6 +149,54 @@ USE_L10N = True
 USE_TZ = True
 
 
+# // list pages (catalog/pagination.py): 'keyset' (cursor links, constant cost
+# // at any depth) or 'offset' (numbered pages with a total)
+CATALOG_PAGINATION = os.environ.get('CATALOG_PAGINATION', 'keyset')
+
+
+# // cache backend, DJANGO_CACHE_BACKEND:
+# //   'locmem'            per process; the default with DEBUG, refused without:
+# //                       cached pages, counts and permissions are retired by
+# //                       generation bumps that every process must see
+# //   'file'              shared by the processes of one host, in DJANGO_CACHE_LOCATION
+# //   'redis'             any Redis-protocol server at DJANGO_CACHE_LOCATION or
+# //                       REDIS_URL (catalog/cache_backends.py); the default without DEBUG
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': ('catalog.cache_backends.FileCache', os.path.join(BASE_DIR, '.cache')),
+    'redis': ('catalog.cache_backends.RedisCache', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')),
+}
+_cache_backend_name = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem' if DEBUG else 'redis')
+if _cache_backend_name == 'locmem' and not DEBUG:
+    raise ImproperlyConfigured("DJANGO_CACHE_BACKEND 'locmem' is per process: use 'redis' or 'file' in production")
+_cache_backend, _cache_location = CACHE_BACKENDS[_cache_backend_name]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', _cache_location),
+    }
+}
+# // catalog/cache.py: default lifetime of cached values (they are keyed by
+# // model generations, so this only reclaims superseded entries)
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+# // anonymous catalog pages (catalog/page_cache.py): entries are retired by
+# // generation bumps, the timeout only bounds what signals cannot see
+CATALOG_PAGE_CACHE_TIMEOUT = 300
+
+
+# // sessions: 'django.contrib.sessions.backends.db' (default), '...cached_db'
+# // (reads from the cache) or '...signed_cookies' (no session table at all)
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
+# // home page visits: buffered per 'process' or in the shared 'cache', then
+# // written in batches (catalog/visits.py)
+CATALOG_VISIT_BUFFER = os.environ.get('CATALOG_VISIT_BUFFER', 'process')
+CATALOG_VISIT_FLUSH_EVERY = 100
+CATALOG_VISIT_FLUSH_INTERVAL = 60
+
+
 # //p8> redirect to homepage if login success.
 LOGIN_REDIRECT_URL = '/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -147,6 +207,23 @@ import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# // read replicas (catalog/db_router.py): DJANGO_REPLICA_URLS, comma-separated
+# // database URLs, become aliases replica1, replica2...; catalog pages read from
+# // them, writes and everything else use default. Locally, two SQLite files:
+# //   cp db.sqlite3 replica.sqlite3
+# //   DJANGO_REPLICA_URLS=sqlite:///$PWD/replica.sqlite3 python manage.py runserver
+DATABASE_REPLICAS = []
+for _number, _url in enumerate(filter(None, os.environ.get('DJANGO_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{_number}'] = dict(
+        dj_database_url.parse(_url.strip(), conn_max_age=500),
+        # // tests read replicas through the primary's test database
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['catalog.db_router.ReplicaRouter']
+# // seconds a visitor's reads stay on the primary after they wrote
+CATALOG_REPLICA_PIN_SECONDS = 5
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
@@ -166,4 +243,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # // https://warehouse.python.org/project/whitenoise/
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# // tests run without collectstatic (webproj/test_runner.py)
+TEST_RUNNER = 'webproj.test_runner.StaticFilesTestRunner'
+
 
@@ -0,0 +1,20 @@
+# // /webproj/test_runner.py
+# // Test runner for `manage.py test` (settings.TEST_RUNNER).
+# // The manifest storage of production (STATICFILES_STORAGE) only serves
+# // files that collectstatic hashed into STATIC_ROOT; tests render templates
+# // with {% static %} without running it, so they use the plain storage.
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class StaticFilesTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.static_settings = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+        self.static_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.static_settings.disable()
+        super().teardown_test_environment(**kwargs)